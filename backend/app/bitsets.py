@@ -0,0 +1,128 @@
+"""
+Битовые множества завершённых узлов для массовой проверки доступности
+
+Узлам присваиваются плотные индексы, завершённые пользователем узлы хранятся
+одним целым числом (битом на узел), обязательные блокировки узла - маской.
+Узлы с одинаковой маской блокировок объединены в группы, поэтому доступность
+всех узлов для пользователя - несколько AND/OR по числу различных масок.
+
+Снимок строится по индексу графа и таблице progress и перестраивается вместе
+с индексом графа; update_progress меняет биты после commit.
+"""
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from . import models
+from .graph import RoadmapGraph, graph_index
+
+
+class CompletionBitsets:
+    def __init__(self, graph: RoadmapGraph, completed: Iterable[Tuple[int, int]] = ()):
+        self.graph = graph
+        self.node_ids: List[int] = sorted(graph.direction)
+        self.index: Dict[int, int] = {node_id: position for position, node_id in enumerate(self.node_ids)}
+
+        required_masks: Dict[int, int] = {}
+        for blocking_id, blocked_ids in graph.required_blocked.items():
+            bit = self.mask([blocking_id])
+            for blocked_id in blocked_ids:
+                required_masks[blocked_id] = required_masks.get(blocked_id, 0) | bit
+        # Маска обязательных блокировок -> маска узлов с такими блокировками
+        self.groups: Dict[int, int] = {}
+        for node_id, position in self.index.items():
+            required = required_masks.get(node_id, 0)
+            self.groups[required] = self.groups.get(required, 0) | (1 << position)
+
+        self.completed: Dict[int, int] = {}
+        for user_id, node_id in completed:
+            self.set_completed(user_id, node_id, True)
+
+    @classmethod
+    def load(cls, db: Session, graph: RoadmapGraph) -> "CompletionBitsets":
+        """Строит снимок одним запросом к progress; блокировки берутся из графа"""
+        completed = db.query(models.Progress.user_id, models.Progress.node_id).filter(
+            models.Progress.status == "completed"
+        ).all()
+        return cls(graph, [tuple(row) for row in completed])
+
+    def mask(self, node_ids: Iterable[int]) -> int:
+        bits = 0
+        for node_id in node_ids:
+            position = self.index.get(node_id)
+            if position is not None:
+                bits |= 1 << position
+        return bits
+
+    def node_ids_of(self, bits: int) -> List[int]:
+        """ID узлов по установленным битам, по возрастанию ID"""
+        node_ids = []
+        while bits:
+            lowest = bits & -bits
+            node_ids.append(self.node_ids[lowest.bit_length() - 1])
+            bits ^= lowest
+        return node_ids
+
+    def set_completed(self, user_id: int, node_id: int, completed: bool) -> None:
+        position = self.index.get(node_id)
+        if position is None:
+            return
+        bits = self.completed.get(user_id, 0)
+        self.completed[user_id] = bits | (1 << position) if completed else bits & ~(1 << position)
+
+    def available_mask(self, user_id: int) -> int:
+        done = self.completed.get(user_id, 0)
+        available = 0
+        for required, nodes in self.groups.items():
+            if done & required == required:
+                available |= nodes
+        return available
+
+    def availability(
+        self, user_ids: Iterable[int], node_ids: Optional[Iterable[int]] = None
+    ) -> Dict[int, List[int]]:
+        """Доступные узлы (из node_ids или все) для каждого пользователя"""
+        selection = self.mask(node_ids) if node_ids is not None else (1 << len(self.node_ids)) - 1
+        return {
+            user_id: self.node_ids_of(self.available_mask(user_id) & selection)
+            for user_id in user_ids
+        }
+
+
+class CompletionIndex:
+    """Лениво перестраиваемый снимок CompletionBitsets, общий для всего процесса"""
+
+    def __init__(self):
+        self._bitsets: Optional[CompletionBitsets] = None
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get(self, db: Session) -> CompletionBitsets:
+        graph = graph_index.get(db)
+        bitsets = self._bitsets
+        if bitsets is not None and bitsets.graph is graph:
+            return bitsets
+        with self._lock:
+            if self._bitsets is None or self._bitsets.graph is not graph:
+                generation = self._generation
+                bitsets = CompletionBitsets.load(db, graph)
+                # Прогресс, изменённый во время построения, делает снимок устаревшим
+                if generation == self._generation:
+                    self._bitsets = bitsets
+                return bitsets
+            return self._bitsets
+
+    def set_completed(self, user_id: int, node_id: int, completed: bool) -> None:
+        with self._lock:
+            self._generation += 1
+            if self._bitsets is not None:
+                self._bitsets.set_completed(user_id, node_id, completed)
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._bitsets = None
+
+
+completion_index = CompletionIndex()
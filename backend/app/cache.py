@@ -0,0 +1,228 @@
+"""
+Версия роадмапа и HTTP-кэширование ответов
+"""
+import secrets
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from fastapi import Request, Response
+
+from .compression import choose_encoding, compress, encoded_etag
+from .responses import JSON_MEDIA_TYPE, MSGPACK_MEDIA_TYPE, accepts_msgpack, encode_payload
+from .settings import settings
+
+# Область кэша для полного роадмапа; направления кэшируются как "direction:<имя>"
+ALL_SCOPE = "all"
+
+# Кодировка несжатого тела в записи кэша
+IDENTITY = "identity"
+
+# Учитываемый размер записи сверх тел и ключа: словарь кодировок, узел OrderedDict
+ENTRY_OVERHEAD = 512
+
+# Vary для 304 и 200 одинаковый: представление зависит от Accept и Accept-Encoding
+VARY = "Accept, Accept-Encoding"
+
+
+class RoadmapVersion:
+    """Монотонно растущий номер версии роадмапа в пределах процесса"""
+
+    def __init__(self):
+        # Эпоха отличает версии разных процессов и перезапусков
+        self.epoch = secrets.token_hex(4)
+        self._value = 0
+        self._lock = threading.Lock()
+
+    @property
+    def value(self) -> int:
+        return self._value
+
+    def bump(self) -> int:
+        with self._lock:
+            self._value += 1
+            return self._value
+
+    def etag(self, suffix: str = "") -> str:
+        return f'"{self.epoch}-{self._value}{suffix}"'
+
+
+roadmap_version = RoadmapVersion()
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Слабое сравнение из If-None-Match (RFC 9110, 13.1.2)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (tag.strip() for tag in if_none_match.split(","))
+    return etag in (tag[2:] if tag.startswith("W/") else tag for tag in candidates)
+
+
+def check_not_modified(request: Request, response: Response) -> Optional[Response]:
+    """
+    Возвращает готовый 304, если клиент прислал актуальный ETag.
+    Иначе проставляет ETag в ответ и возвращает None.
+    """
+    # У MessagePack-представления свой ETag: то же состояние, другие байты.
+    # Сжатое тело получает ещё и суффикс кодировки (encoded_etag), поэтому
+    # совпадением считается и он; 304 повторяет совпавший тег
+    etag = roadmap_version.etag("-msgpack" if accepts_msgpack(request) else "")
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": VARY}
+    if_none_match = request.headers.get("if-none-match")
+    encoding = choose_encoding(request.headers.get("accept-encoding"))
+    for candidate in (etag, encoded_etag(etag, encoding)) if encoding else (etag,):
+        if etag_matches(if_none_match, candidate):
+            return Response(status_code=304, headers={**headers, "ETag": candidate})
+    response.headers.update(headers)
+    return None
+
+
+def direction_scope(direction: str) -> str:
+    return f"direction:{direction}"
+
+
+def _entry_size(key: Tuple[str, str, str], bodies: Dict[str, bytes]) -> int:
+    return ENTRY_OVERHEAD + sum(len(part) for part in key) + sum(len(body) for body in bodies.values())
+
+
+class RenderedCache:
+    """
+    LRU-кэш готовых ответов с ограничением по суммарному размеру.
+
+    Ключ - (область, вариант представления, media type). Значение - тело
+    под кодировкой IDENTITY и уже сжатые варианты ("gzip", "br"), которые
+    добавляются по мере запросов. В размер записи входят тела, ключ и
+    ENTRY_OVERHEAD, так что бюджет ограничивает и число записей. Инвалидация идёт
+    по областям; поколение не даёт сохранить ответ, отрисованный до записи.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.generation = 0
+        self._entries: "OrderedDict[Tuple[str, str, str], Dict[str, bytes]]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple[str, str, str]) -> Optional[Dict[str, bytes]]:
+        """Тела записи по кодировкам (копия) или None"""
+        with self._lock:
+            bodies = self._entries.get(key)
+            if bodies is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(bodies)
+
+    def put(self, key: Tuple[str, str, str], body: bytes, generation: int) -> None:
+        bodies = {IDENTITY: body}
+        if _entry_size(key, bodies) > self.max_bytes:
+            return
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._discard(key)
+            self._entries[key] = bodies
+            self._size += _entry_size(key, bodies)
+            self._evict()
+
+    def add_encoding(self, key: Tuple[str, str, str], encoding: str, body: bytes) -> None:
+        """Кладёт сжатый вариант рядом с исходным телом, если запись ещё в кэше"""
+        with self._lock:
+            bodies = self._entries.get(key)
+            if bodies is None or encoding in bodies:
+                return
+            bodies[encoding] = body
+            self._size += len(body)
+            self._evict()
+
+    def _evict(self) -> None:
+        while self._size > self.max_bytes:
+            key, evicted = self._entries.popitem(last=False)
+            self._size -= _entry_size(key, evicted)
+
+    def invalidate(self, scopes: Optional[Iterable[str]] = None) -> None:
+        """Сбрасывает указанные области (и всегда полный роадмап); None - всё"""
+        with self._lock:
+            self.generation += 1
+            if scopes is None:
+                self._entries.clear()
+                self._size = 0
+                return
+            scopes = set(scopes) | {ALL_SCOPE}
+            for key in [key for key in self._entries if key[0] in scopes]:
+                self._discard(key)
+
+    def _discard(self, key: Tuple[str, str, str]) -> None:
+        bodies = self._entries.pop(key, None)
+        if bodies is not None:
+            self._size -= _entry_size(key, bodies)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "size_bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+rendered_cache = RenderedCache(settings.roadmap_cache_max_bytes)
+
+
+def encoded_response(payload: Any, request: Request, response: Response) -> Response:
+    """
+    Сериализует payload (модели, списки, dict) в JSON или MessagePack по Accept
+    без повторной валидации по response_model и переносит заголовки из response.
+    """
+    body, media_type = encode_payload(payload, request)
+    return Response(content=body, media_type=media_type, headers=dict(response.headers))
+
+
+def cached_response(
+    scope: str,
+    variant: str,
+    render: Callable[[], Any],
+    request: Request,
+    response: Response,
+    cache_if: Optional[Callable[[], bool]] = None,
+) -> Response:
+    """
+    Отдаёт ответ из кэша или отрисовывает его через render() и кэширует;
+    JSON и MessagePack кэшируются отдельно. Если клиент принимает сжатие,
+    сжатое тело берётся из той же записи кэша и сжимается только один раз.
+    Заголовки, уже выставленные в response (ETag и т.п.), переносятся.
+    cache_if проверяется после промаха: если он вернул False, ответ отдаётся
+    как обычно, но в кэш не попадает.
+    """
+    media_type = MSGPACK_MEDIA_TYPE if accepts_msgpack(request) else JSON_MEDIA_TYPE
+    key = (scope, variant, media_type)
+    bodies = rendered_cache.get(key)
+    if bodies is None:
+        generation = rendered_cache.generation
+        body, media_type = encode_payload(render(), request)
+        bodies = {IDENTITY: body}
+        if cache_if is None or cache_if():
+            rendered_cache.put(key, body, generation)
+
+    headers = dict(response.headers)
+    body = bodies[IDENTITY]
+    encoding = choose_encoding(request.headers.get("accept-encoding"))
+    if encoding is not None and len(body) >= settings.compression_min_size:
+        compressed = bodies.get(encoding)
+        if compressed is None:
+            compressed = compress(body, encoding)
+            rendered_cache.add_encoding(key, encoding, compressed)
+        body = compressed
+        # dict(response.headers) хранит имена в нижнем регистре
+        headers["content-encoding"] = encoding
+        if "etag" in headers:
+            headers["etag"] = encoded_etag(headers["etag"], encoding)
+        headers["vary"] = VARY
+    return Response(content=body, media_type=media_type, headers=headers)
@@ -62,6 +62,74 @@ def export(output_dir):
         db.close()
 
 
+@cli.command('rebuild-closure')
+def rebuild_closure_command():
+    """Rebuild the roadmap closure table from node links"""
+    from .closure import rebuild_closure
+
+    db = SessionLocal()
+    try:
+        rows = rebuild_closure(db)
+        db.commit()
+        click.echo(f"Closure table rebuilt: {rows} rows")
+        # Кэши роадмапа живут в памяти процесса сервера, отсюда их не сбросить
+        click.echo("Restart running servers to drop their cached roadmap")
+    finally:
+        db.close()
+
+
+def _synthetic_roadmap(node_count: int, fanout: int = 4) -> list:
+    """Дерево из node_count узлов в форме RoadmapNodeOut (каждый узел - до fanout детей)"""
+    nodes = [
+        {
+            "id": i, "title": f"Node {i}", "description": "Synthetic node description. " * 4,
+            "direction": "backend", "resources": [f"https://example.com/docs/{i}"],
+            "checkpoint": i % 5 == 0, "node_type": "task", "is_required": True,
+            "order_index": i, "is_active": True, "children": [], "blocked_by": [], "blocks": [],
+        }
+        for i in range(node_count)
+    ]
+    for i in range(1, node_count):
+        nodes[(i - 1) // fanout]["children"].append(nodes[i])
+    return nodes[:1]
+
+
+@cli.command('benchmark-json')
+@click.option('--repeat', default=50, show_default=True, help='Encodings per payload and encoder')
+@click.option('--synthetic', default=5000, show_default=True, help='Nodes in the synthetic roadmap (0 to skip)')
+def benchmark_json(repeat, synthetic):
+    """Compare JSON and MessagePack encoders on seeded and synthetic roadmap payloads"""
+    import timeit
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+    from . import crud
+    from .responses import FastJSONResponse, MsgPackResponse
+
+    db = SessionLocal()
+    try:
+        # Те же данные, что получает класс ответа после валидации по response_model
+        payloads = {
+            "tree": jsonable_encoder(crud.get_all_nodes(db)),
+            "graph": jsonable_encoder(crud.get_roadmap_graph(db)),
+        }
+    finally:
+        db.close()
+    if synthetic:
+        payloads[f"synth{synthetic}"] = _synthetic_roadmap(synthetic)
+
+    encoders = [
+        ("json", JSONResponse),
+        ("orjson", FastJSONResponse),
+        ("msgpack", MsgPackResponse),
+    ]
+    click.echo(f"{'payload':<12} {'encoder':<8} {'bytes':>10} {'ms/encode':>10}")
+    for payload_name, content in payloads.items():
+        for encoder_name, response_class in encoders:
+            size = len(response_class(content).body)
+            seconds = timeit.timeit(lambda: response_class(content), number=repeat) / repeat
+            click.echo(f"{payload_name:<12} {encoder_name:<8} {size:>10} {seconds * 1000:>10.3f}")
+
+
 @cli.command()
 def status():
     """Show database status"""
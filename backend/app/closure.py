@@ -0,0 +1,84 @@
+"""
+Closure-таблица иерархии роадмапа (предок, потомок, глубина)
+
+Таблица поддерживается функциями записи в crud в той же транзакции,
+что и изменения roadmap_node_links, и полностью перестраивается командой
+`python -m app.cli rebuild-closure`.
+"""
+from typing import Dict, Iterable, List, Set
+
+from sqlalchemy.orm import Session
+
+from . import models
+
+
+def _load_adjacency(db: Session):
+    children: Dict[int, List[int]] = {}
+    parents: Dict[int, List[int]] = {}
+    links = models.roadmap_node_links
+    for source_id, target_id in db.query(links.c.source_id, links.c.target_id).all():
+        children.setdefault(source_id, []).append(target_id)
+        parents.setdefault(target_id, []).append(source_id)
+    return children, parents
+
+
+def _shortest_depths(start_id: int, adjacency: Dict[int, List[int]]) -> Dict[int, int]:
+    """Кратчайшие расстояния от start_id (включая его самого с глубиной 0)"""
+    depths = {start_id: 0}
+    frontier = [start_id]
+    while frontier:
+        next_frontier = []
+        for node_id in frontier:
+            for next_id in adjacency.get(node_id, ()):
+                if next_id not in depths:
+                    depths[next_id] = depths[node_id] + 1
+                    next_frontier.append(next_id)
+        frontier = next_frontier
+    return depths
+
+
+def _insert_rows(db: Session, parents: Dict[int, List[int]], descendant_ids: Iterable[int]) -> None:
+    rows = [
+        {"ancestor_id": ancestor_id, "descendant_id": descendant_id, "depth": depth}
+        for descendant_id in descendant_ids
+        for ancestor_id, depth in _shortest_depths(descendant_id, parents).items()
+    ]
+    if rows:
+        db.execute(models.RoadmapNodeClosure.__table__.insert(), rows)
+
+
+def refresh_closure(db: Session, node_ids: Iterable[int]) -> None:
+    """
+    Пересчитывает строки closure для узлов и всех их потомков.
+
+    Вызывается после flush изменений связей, до commit: множество предков
+    меняется только у узла, чьи родители изменились, и у его потомков.
+    """
+    node_ids = list(node_ids)
+    if not node_ids:
+        return
+    children, parents = _load_adjacency(db)
+    affected: Set[int] = set()
+    for node_id in node_ids:
+        affected.update(_shortest_depths(node_id, children))
+
+    closure = models.RoadmapNodeClosure
+    db.query(closure).filter(closure.descendant_id.in_(affected)).delete(synchronize_session=False)
+    _insert_rows(db, parents, sorted(affected))
+
+
+def remove_from_closure(db: Session, node_id: int) -> None:
+    """Удаляет все строки closure, где участвует узел"""
+    closure = models.RoadmapNodeClosure
+    db.query(closure).filter(
+        (closure.ancestor_id == node_id) | (closure.descendant_id == node_id)
+    ).delete(synchronize_session=False)
+
+
+def rebuild_closure(db: Session) -> int:
+    """Полностью перестраивает closure-таблицу; возвращает число строк"""
+    _, parents = _load_adjacency(db)
+    node_ids = [node_id for (node_id,) in db.query(models.RoadmapNode.id).all()]
+    db.query(models.RoadmapNodeClosure).delete(synchronize_session=False)
+    _insert_rows(db, parents, node_ids)
+    return db.query(models.RoadmapNodeClosure).count()
@@ -1,25 +1,57 @@
-from typing import List, Optional
+import base64
+import json
+from typing import Dict, Iterable, List, Optional, Set, Tuple
 
+from sqlalchemy import func, tuple_
 from sqlalchemy.orm import Session
 
 from . import models, schemas
+from .bitsets import completion_index
+from .cache import direction_scope, rendered_cache, roadmap_version
+from .closure import refresh_closure, remove_from_closure
+from .frontier import refresh_unlocked
+from .graph import graph_index
+from .loader import load_nodes
+from .xp import badges_for, completion_xp
+
+
+def roadmap_changed(directions: Optional[Iterable[str]] = None) -> None:
+    """
+    Drops process-wide caches derived from the roadmap structure
+    and bumps the roadmap version used for ETags.
+    Rendered payloads are dropped only for the given directions
+    (and the full roadmap); None drops all of them.
+    """
+    graph_index.invalidate()
+    roadmap_version.bump()
+    rendered_cache.invalidate(
+        None if directions is None else [direction_scope(direction) for direction in directions]
+    )
+
+
+def _affected_directions(db: Session, node_ids: Iterable[int], *directions: str) -> Set[str]:
+    """
+    Directions whose rendered trees contain any of the nodes, taken from the graph
+    before the write, plus explicitly given ones.
+    """
+    return graph_index.get(db).affected_directions(node_ids) | set(directions)
 
 
 def get_node(db: Session, node_id: int) -> Optional[schemas.RoadmapNodeOut]:
     """
     Retrieves a single roadmap node by its ID.
     """
-    node = db.query(models.RoadmapNode).filter(models.RoadmapNode.id == node_id).first()
-    if not node:
+    nodes = load_nodes(db, [node_id], max_depth=schemas.MAX_TREE_DEPTH)
+    if not nodes:
         return None
-    return schemas.RoadmapNodeOut.model_validate(node)
+    return schemas.RoadmapNodeOut.model_validate(nodes[0])
 
 
 def get_all_nodes(db: Session) -> List[schemas.RoadmapNodeOut]:
     """
     Retrieves all roadmap nodes.
     """
-    nodes = db.query(models.RoadmapNode).all()
+    nodes = load_nodes(db)
     return [schemas.RoadmapNodeOut.model_validate(node) for node in nodes]
 
 
@@ -27,55 +59,323 @@ def get_nodes_by_direction(db: Session, direction: str) -> List[schemas.RoadmapN
     """
     Retrieves all roadmap nodes for a specific direction.
     """
-    nodes = db.query(models.RoadmapNode).filter(models.RoadmapNode.direction == direction).all()
+    graph = graph_index.get(db)
+    nodes = load_nodes(db, [
+        node_id for node_id, node_direction in graph.direction.items() if node_direction == direction
+    ])
     return [schemas.RoadmapNodeOut.model_validate(node) for node in nodes]
 
 
+def get_root_node_ids(db: Session, direction: str) -> List[int]:
+    """
+    Returns IDs of root nodes (nodes without parents) for a direction.
+    """
+    return graph_index.get(db).roots(direction)
+
+
 def get_root_nodes_by_direction(db: Session, direction: str) -> List[schemas.RoadmapNodeOut]:
     """
     Retrieves only root nodes (nodes without parents) for a specific direction.
     """
-    # Получаем все узлы для направления
-    all_nodes = db.query(models.RoadmapNode).filter(models.RoadmapNode.direction == direction).all()
-    
-    # Фильтруем только корневые узлы (те, у которых нет родителей)
-    root_nodes = []
-    for node in all_nodes:
-        # Проверяем, не является ли этот узел дочерним для какого-либо другого узла
-        is_child = False
-        for other_node in all_nodes:
-            if other_node.children and any(child.id == node.id for child in other_node.children):
-                is_child = True
-                break
-        
-        if not is_child:
-            root_nodes.append(node)
-    
-    return [schemas.RoadmapNodeOut.model_validate(node) for node in root_nodes]
+    root_ids = get_root_node_ids(db, direction)
+    if not root_ids:
+        return []
+
+    nodes = load_nodes(db, root_ids, max_depth=schemas.MAX_TREE_DEPTH)
+    nodes_by_id = {node.id: node for node in nodes}
+    return [
+        schemas.RoadmapNodeOut.model_validate(nodes_by_id[node_id])
+        for node_id in root_ids
+        if node_id in nodes_by_id
+    ]
+
+
+def get_direction_layout(db: Session, direction: str) -> schemas.RoadmapLayoutOut:
+    """
+    Computes the layered layout of a direction's tree: topological order,
+    longest-path level and position within the level.
+    """
+    layout = graph_index.get(db).layout(direction)
+    return schemas.RoadmapLayoutOut(
+        direction=direction,
+        level_count=max((level for _, level, _ in layout), default=-1) + 1,
+        nodes=[
+            schemas.RoadmapLayoutNodeOut(id=node_id, level=level, position=position)
+            for node_id, level, position in layout
+        ],
+    )
+
+
+def _sparse_node(node: models.RoadmapNode, fields: List[str], depth: int, visited: Optional[Set[int]] = None) -> dict:
+    """
+    Как RoadmapNodeOut.model_validate: общий узел выводится целиком один раз
+    за вызов, в остальных местах - только с id и пустыми children.
+    """
+    if visited is None:
+        visited = set()
+    if node.id in visited:
+        return {"id": node.id, "children": []} if depth > 0 else {"id": node.id}
+    visited.add(node.id)
+    data = {"id": node.id}
+    for field in fields:
+        value = getattr(node, field)
+        if field == "resources":
+            value = value or []
+        elif field == "description":
+            value = value or ""
+        elif field in schemas.NODE_BLOCK_FIELDS:
+            value = [schemas.NodeBlockOut.model_validate(block) for block in value]
+        data[field] = value
+    if depth > 0:
+        data["children"] = [_sparse_node(child, fields, depth - 1, visited) for child in node.children]
+    return data
+
+
+def get_sparse_nodes(
+    db: Session,
+    node_ids: Optional[List[int]] = None,
+    fields: Optional[List[str]] = None,
+    depth: int = schemas.MAX_TREE_DEPTH,
+) -> List[dict]:
+    """
+    Retrieves nodes (all, or the given IDs in order) as dicts holding only the
+    requested fields, with children nested `depth` levels deep. Only the needed
+    columns are selected and blocks are queried only when asked for.
+    """
+    if fields is None:
+        fields = list(schemas.NODE_COLUMN_FIELDS + schemas.NODE_BLOCK_FIELDS)
+    nodes = load_nodes(
+        db,
+        node_ids,
+        max_depth=depth,
+        columns=[field for field in fields if field in schemas.NODE_COLUMN_FIELDS],
+        with_blocks=any(field in schemas.NODE_BLOCK_FIELDS for field in fields),
+    )
+    if node_ids is not None:
+        nodes_by_id = {node.id: node for node in nodes}
+        nodes = [nodes_by_id[node_id] for node_id in node_ids if node_id in nodes_by_id]
+    return [_sparse_node(node, fields, depth) for node in nodes]
+
+
+def get_node_children(
+    db: Session, node_id: int, limit: int, offset: int = 0, depth: int = 1
+) -> Optional[Tuple[List[schemas.RoadmapNodeChildOut], int]]:
+    """
+    Retrieves a page of a node's children (ordered by order_index, id) and the
+    total number of children. Each child carries has_children; with depth > 1
+    grandchildren are nested up to that depth (deeper levels are not paged).
+    Returns None if the node does not exist.
+    """
+    graph = graph_index.get(db)
+    if node_id not in graph:
+        return None
+    child_ids = graph.get_children(node_id)
+    page_ids = child_ids[offset:offset + limit]
+
+    levels = [page_ids]
+    for _ in range(depth - 1):
+        levels.append([grandchild_id for child_id in levels[-1] for grandchild_id in graph.get_children(child_id)])
+    wanted = {node_id for level in levels for node_id in level}
+    nodes_by_id = {
+        node.id: node
+        for node in db.query(models.RoadmapNode).filter(models.RoadmapNode.id.in_(wanted)).all()
+    } if wanted else {}
+
+    def build(ids: List[int], level: int) -> List[schemas.RoadmapNodeChildOut]:
+        children = []
+        for child_id in ids:
+            node = nodes_by_id.get(child_id)
+            if node is None:
+                continue
+            grandchildren = graph.get_children(child_id)
+            children.append(schemas.RoadmapNodeChildOut(
+                **dict(schemas.RoadmapNodeFlatOut.model_validate(node)),
+                has_children=bool(grandchildren),
+                children=build(grandchildren, level + 1) if level < depth else [],
+            ))
+        return children
+
+    return build(page_ids, 1), len(child_ids)
+
+
+def _get_relatives(db: Session, node_id: int, ancestors: bool) -> Optional[List[schemas.RoadmapNodeRelativeOut]]:
+    if node_id not in graph_index.get(db):
+        return None
+    closure = models.RoadmapNodeClosure
+    if ancestors:
+        join_on, match = closure.ancestor_id, closure.descendant_id
+    else:
+        join_on, match = closure.descendant_id, closure.ancestor_id
+    rows = (
+        db.query(models.RoadmapNode, closure.depth)
+        .join(closure, join_on == models.RoadmapNode.id)
+        .filter(match == node_id, closure.depth > 0)
+        .order_by(closure.depth, models.RoadmapNode.order_index, models.RoadmapNode.id)
+        .all()
+    )
+    return [
+        schemas.RoadmapNodeRelativeOut(**dict(schemas.RoadmapNodeFlatOut.model_validate(node)), depth=depth)
+        for node, depth in rows
+    ]
+
+
+def get_node_ancestors(db: Session, node_id: int) -> Optional[List[schemas.RoadmapNodeRelativeOut]]:
+    """
+    Retrieves all ancestors of a node, nearest first, with one closure-table query.
+    Returns None if the node does not exist.
+    """
+    return _get_relatives(db, node_id, ancestors=True)
+
+
+def get_node_descendants(db: Session, node_id: int) -> Optional[List[schemas.RoadmapNodeRelativeOut]]:
+    """
+    Retrieves all descendants of a node, nearest first, with one closure-table query.
+    Returns None if the node does not exist.
+    """
+    return _get_relatives(db, node_id, ancestors=False)
+
+
+def get_roadmap_graph(
+    db: Session,
+    direction: Optional[str] = None,
+    page_ids: Optional[List[int]] = None,
+) -> schemas.RoadmapGraphOut:
+    """
+    Retrieves the roadmap as a flat graph: every node once plus edges and blocks.
+    With a direction, only its root nodes and their descendants are included.
+    With page_ids, only those nodes with their outgoing edges and incoming blocks
+    are included, so that every edge and block appears on exactly one page.
+    """
+    graph = graph_index.get(db)
+    node_query = db.query(models.RoadmapNode)
+    block_query = db.query(models.NodeBlock)
+    if page_ids is not None:
+        if not page_ids:
+            return schemas.RoadmapGraphOut(nodes=[], edges=[], blocks=[])
+        node_query = node_query.filter(models.RoadmapNode.id.in_(page_ids))
+        block_query = block_query.filter(models.NodeBlock.blocked_node_id.in_(page_ids))
+    elif direction is not None:
+        node_ids = graph.descendants(graph.roots(direction))
+        if not node_ids:
+            return schemas.RoadmapGraphOut(nodes=[], edges=[], blocks=[])
+        node_query = node_query.filter(models.RoadmapNode.id.in_(node_ids))
+        block_query = block_query.filter(
+            models.NodeBlock.blocked_node_id.in_(node_ids)
+            | models.NodeBlock.blocking_node_id.in_(node_ids)
+        )
+
+    nodes = node_query.order_by(models.RoadmapNode.id).all()
+    if page_ids is not None:
+        position = {node_id: index for index, node_id in enumerate(page_ids)}
+        nodes.sort(key=lambda node: position[node.id])
+    included = {node.id for node in nodes}
+    edges = [
+        schemas.RoadmapEdgeOut(source_id=node.id, target_id=child_id)
+        for node in nodes
+        for child_id in graph.get_children(node.id)
+        if page_ids is not None or child_id in included
+    ]
+    blocks = block_query.order_by(models.NodeBlock.id).all()
+    return schemas.RoadmapGraphOut(
+        nodes=[schemas.RoadmapNodeFlatOut.model_validate(node) for node in nodes],
+        edges=edges,
+        blocks=[schemas.NodeBlockOut.model_validate(block) for block in blocks],
+    )
+
+
+def encode_cursor(direction: str, order_index: int, node_id: int) -> str:
+    """
+    Encodes a keyset position (direction, order_index, id) as an opaque cursor.
+    """
+    raw = json.dumps([direction, order_index, node_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, int, int]:
+    """
+    Decodes a cursor produced by encode_cursor; raises ValueError if it is malformed.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        direction, order_index, node_id = json.loads(raw)
+    except (ValueError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
+    if not (isinstance(direction, str) and isinstance(order_index, int) and isinstance(node_id, int)):
+        raise ValueError("Invalid cursor")
+    return direction, order_index, node_id
+
+
+def get_node_page_ids(db: Session, limit: int, cursor: Optional[str] = None) -> Tuple[List[int], Optional[str]]:
+    """
+    Returns one page of node IDs in (direction, order_index, id) order and the
+    cursor of the next page (None on the last page). Uses keyset pagination, so
+    every page costs the same regardless of its position.
+    """
+    key = (models.RoadmapNode.direction, models.RoadmapNode.order_index, models.RoadmapNode.id)
+    query = db.query(*key).order_by(*key)
+    if cursor:
+        query = query.filter(tuple_(*key) > tuple_(*decode_cursor(cursor)))
+    rows = query.limit(limit + 1).all()
+
+    next_cursor = encode_cursor(*rows[limit - 1]) if len(rows) > limit else None
+    return [row.id for row in rows[:limit]], next_cursor
+
+
+def get_roadmap_page(
+    db: Session,
+    limit: int,
+    cursor: Optional[str] = None,
+    response_format: str = "tree",
+    fields: Optional[List[str]] = None,
+    depth: Optional[int] = None,
+):
+    """
+    Retrieves one page of roadmap nodes and the cursor of the next page.
+    The page is a list of nested nodes, or a RoadmapGraphOut for format "graph".
+    With fields or depth the nodes are sparse dicts (see get_sparse_nodes).
+    """
+    page_ids, next_cursor = get_node_page_ids(db, limit, cursor)
+    if response_format == "graph":
+        return get_roadmap_graph(db, page_ids=page_ids), next_cursor
+    if fields is not None or depth is not None:
+        depth = schemas.MAX_TREE_DEPTH if depth is None else depth
+        return get_sparse_nodes(db, page_ids, fields, depth), next_cursor
+
+    nodes_by_id = {
+        node.id: node for node in load_nodes(db, page_ids, max_depth=schemas.MAX_TREE_DEPTH)
+    }
+    return [
+        schemas.RoadmapNodeOut.model_validate(nodes_by_id[node_id])
+        for node_id in page_ids
+        if node_id in nodes_by_id
+    ], next_cursor
 
 
 def create_node(db: Session, node: schemas.RoadmapNodeCreate) -> schemas.RoadmapNodeOut:
     """
     Creates a new roadmap node and links it to parent nodes if specified.
     """
-    import json
+    directions = _affected_directions(db, node.parent_ids or [], node.direction)
     db_node = models.RoadmapNode(
         title=node.title,
         description=node.description,
         direction=node.direction,
-        resources=json.dumps(node.resources),  # Store as JSON string
+        resources=list(node.resources),
         checkpoint=node.checkpoint,
     )
     db.add(db_node)
-    db.commit()
-    db.refresh(db_node)
+    db.flush()
 
     if node.parent_ids:
         parents = db.query(models.RoadmapNode).filter(models.RoadmapNode.id.in_(node.parent_ids)).all()
         for parent in parents:
             parent.children.append(db_node)
-        db.commit()
+        db.flush()
 
+    refresh_closure(db, [db_node.id])
+    db.commit()
+    db.refresh(db_node)
+    roadmap_changed(directions)
     return schemas.RoadmapNodeOut.model_validate(db_node)
 
 
@@ -218,12 +518,14 @@ def create_node_with_blocks(db: Session, node: schemas.RoadmapNodeCreate) -> sch
     """
     Создание узла с блокировками.
     """
-    import json
+    directions = _affected_directions(
+        db, [*(node.parent_ids or []), *(node.blocking_node_ids or [])], node.direction
+    )
     db_node = models.RoadmapNode(
         title=node.title,
         description=node.description,
         direction=node.direction,
-        resources=json.dumps(node.resources),
+        resources=list(node.resources),
         checkpoint=node.checkpoint,
         node_type=node.node_type,
         is_required=node.is_required,
@@ -231,15 +533,16 @@ def create_node_with_blocks(db: Session, node: schemas.RoadmapNodeCreate) -> sch
         is_active=node.is_active,
     )
     db.add(db_node)
-    db.commit()
-    db.refresh(db_node)
+    db.flush()
 
-    # Создание связей с родителями
+    # Создание связей с родителями. У нового узла нет ни детей, ни заблокированных
+    # им узлов, поэтому ни связи, ни блокировки ниже не могут замкнуть цикл
     if node.parent_ids:
         parents = db.query(models.RoadmapNode).filter(models.RoadmapNode.id.in_(node.parent_ids)).all()
         for parent in parents:
             parent.children.append(db_node)
-        db.commit()
+        db.flush()
+    refresh_closure(db, [db_node.id])
 
     # Создание блокировок
     if node.blocking_node_ids:
@@ -250,8 +553,12 @@ def create_node_with_blocks(db: Session, node: schemas.RoadmapNodeCreate) -> sch
                 block_type="required"
             )
             db.add(block)
-        db.commit()
+        db.flush()
+        refresh_unlocked(db, [db_node.id])
 
+    db.commit()
+    db.refresh(db_node)
+    roadmap_changed(directions)
     return schemas.RoadmapNodeOut.model_validate(db_node)
 
 
@@ -259,16 +566,28 @@ def update_node_with_blocks(db: Session, node_id: int, node: schemas.RoadmapNode
     """
     Обновление узла с блокировками.
     """
-    import json
     db_node = db.query(models.RoadmapNode).filter(models.RoadmapNode.id == node_id).first()
     if not db_node:
         raise ValueError("Node not found")
 
+    # Затронутые направления считаем по графу до изменений
+    touched_ids = [node_id, *(node.parent_ids or []), *(node.blocking_node_ids or [])]
+    if node.blocking_node_ids:
+        touched_ids.extend(block.blocking_node_id for block in db_node.blocked_by)
+    directions = _affected_directions(db, touched_ids, db_node.direction, node.direction)
+
+    # Новые рёбра входят в узел, поэтому цикл возможен, только если источник - его потомок
+    graph = graph_index.get(db)
+    for parent_id in node.parent_ids or []:
+        graph.check_link(parent_id, node_id)
+    for blocking_id in node.blocking_node_ids or []:
+        graph.check_block(blocking_id, node_id)
+
     # Обновляем основные поля
     db_node.title = node.title
     db_node.description = node.description
     db_node.direction = node.direction
-    db_node.resources = json.dumps(node.resources)
+    db_node.resources = list(node.resources)
     db_node.checkpoint = node.checkpoint
     db_node.node_type = node.node_type
     db_node.is_required = node.is_required
@@ -283,6 +602,8 @@ def update_node_with_blocks(db: Session, node_id: int, node: schemas.RoadmapNode
         parents = db.query(models.RoadmapNode).filter(models.RoadmapNode.id.in_(node.parent_ids)).all()
         for parent in parents:
             parent.children.append(db_node)
+        db.flush()
+        refresh_closure(db, [node_id])
 
     # Обновляем блокировки
     if node.blocking_node_ids:
@@ -296,8 +617,11 @@ def update_node_with_blocks(db: Session, node_id: int, node: schemas.RoadmapNode
                 block_type="required"
             )
             db.add(block)
+        db.flush()
+        refresh_unlocked(db, [node_id])
 
     db.commit()
+    roadmap_changed(directions)
     db.refresh(db_node)
     return schemas.RoadmapNodeOut.model_validate(db_node)
 
@@ -310,22 +634,41 @@ def delete_node_cascade(db: Session, node_id: int) -> bool:
     if not db_node:
         return False
 
-    # Удаляем блокировки
+    # Дети удаляемого узла могут стать корнями своих направлений
+    graph = graph_index.get(db)
+    directions = _affected_directions(
+        db,
+        [node_id, *(block.blocking_node_id for block in db_node.blocked_by),
+         *(block.blocked_node_id for block in db_node.blocks)],
+        db_node.direction,
+        *(graph.direction[child_id] for child_id in graph.get_children(node_id) if child_id in graph),
+    )
+
+    # Удаляем блокировки; узлы, которые блокировал этот, пересчитаем ниже
+    unblocked_ids = [block.blocked_node_id for block in db_node.blocks]
     db.query(models.NodeBlock).filter(
         (models.NodeBlock.blocking_node_id == node_id) | 
         (models.NodeBlock.blocked_node_id == node_id)
     ).delete()
+    db.query(models.UserUnlockedNode).filter(models.UserUnlockedNode.node_id == node_id).delete()
 
-    # Удаляем связи с родителями
+    # Удаляем связи с родителями; потомки теряют предков через этот узел
+    child_ids = [child.id for child in db_node.children]
     db_node.parents.clear()
     db_node.children.clear()
+    db.flush()
+    remove_from_closure(db, node_id)
+    refresh_closure(db, child_ids)
 
     # Удаляем прогресс
     db.query(models.Progress).filter(models.Progress.node_id == node_id).delete()
+    db.flush()
+    refresh_unlocked(db, unblocked_ids)
 
     # Удаляем сам узел
     db.delete(db_node)
     db.commit()
+    roadmap_changed(directions)
     return True
 
 
@@ -333,13 +676,83 @@ def get_node_dependencies(db: Session, node_id: int) -> List[schemas.RoadmapNode
     """
     Получение зависимостей узла (узлы, которые блокируют этот узел).
     """
-    blocks = db.query(models.NodeBlock).filter(models.NodeBlock.blocked_node_id == node_id).all()
-    blocking_nodes = []
-    for block in blocks:
-        node = db.query(models.RoadmapNode).filter(models.RoadmapNode.id == block.blocking_node_id).first()
-        if node:
-            blocking_nodes.append(schemas.RoadmapNodeOut.model_validate(node))
-    return blocking_nodes
+    blocking_ids = [
+        blocking_id for (blocking_id,) in
+        db.query(models.NodeBlock.blocking_node_id)
+        .filter(models.NodeBlock.blocked_node_id == node_id)
+        .order_by(models.NodeBlock.id)
+    ]
+    nodes_by_id = {node.id: node for node in load_nodes(db, blocking_ids, max_depth=schemas.MAX_TREE_DEPTH)}
+    return [
+        schemas.RoadmapNodeOut.model_validate(nodes_by_id[blocking_id])
+        for blocking_id in dict.fromkeys(blocking_ids)
+        if blocking_id in nodes_by_id
+    ]
+
+
+def get_transitive_dependencies(db: Session, node_id: int) -> List[schemas.RoadmapNodeRelativeOut]:
+    """
+    Полная цепочка зависимостей узла с глубиной (1 - блокирует напрямую):
+    обход по индексу графа и один запрос узлов.
+    """
+    prerequisites = graph_index.get(db).prerequisites(node_id)
+    if not prerequisites:
+        return []
+    nodes_by_id = {
+        node.id: node
+        for node in db.query(models.RoadmapNode).filter(
+            models.RoadmapNode.id.in_([blocking_id for blocking_id, _ in prerequisites])
+        )
+    }
+    return [
+        schemas.RoadmapNodeRelativeOut(**dict(schemas.RoadmapNodeFlatOut.model_validate(nodes_by_id[blocking_id])), depth=depth)
+        for blocking_id, depth in prerequisites
+        if blocking_id in nodes_by_id
+    ]
+
+
+def _unmet_blocks(db: Session, node_ids: List[int], user_id: int) -> Dict[int, List[dict]]:
+    """
+    Незавершённые пользователем блокировки узлов одним запросом:
+    node_blocks JOIN блокирующий узел LEFT JOIN его прогресс.
+    """
+    if not node_ids:
+        return {}
+    block = models.NodeBlock
+    blocking = models.RoadmapNode
+    progress = models.Progress
+    rows = (
+        db.query(block.blocked_node_id, block.blocking_node_id, block.block_type, blocking.title, progress.status)
+        .join(blocking, blocking.id == block.blocking_node_id)
+        .outerjoin(progress, (progress.node_id == block.blocking_node_id) & (progress.user_id == user_id))
+        .filter(block.blocked_node_id.in_(node_ids))
+        .order_by(block.id)
+        .all()
+    )
+    reasons: Dict[int, List[dict]] = {}
+    for blocked_id, blocking_id, block_type, title, status in rows:
+        if status == "completed":
+            continue
+        reasons.setdefault(blocked_id, []).append({
+            "type": "required_block" if block_type == "required" else "optional_block",
+            "blocking_node": title,
+            "blocking_node_id": blocking_id,
+        })
+    return reasons
+
+
+def get_user_frontier(db: Session, user_id: int) -> List[int]:
+    """
+    Узлы, все обязательные блокировки которых пользователь завершил: узлы без
+    таких блокировок берутся из индекса графа, остальные - одним чтением
+    user_unlocked_nodes по первичному ключу.
+    """
+    graph = graph_index.get(db)
+    unlocked = [
+        node_id for (node_id,) in
+        db.query(models.UserUnlockedNode.node_id).filter(models.UserUnlockedNode.user_id == user_id)
+    ]
+    return sorted(set(graph.unblocked).union(unlocked), key=lambda node_id: graph.order_key.get(node_id, (0, node_id)))
 
 
 def check_node_availability(db: Session, node_id: int, user_id: int) -> dict:
@@ -349,35 +762,8 @@ def check_node_availability(db: Session, node_id: int, user_id: int) -> dict:
     node = db.query(models.RoadmapNode).filter(models.RoadmapNode.id == node_id).first()
     if not node:
         return {"available": False, "reason": "Node not found"}
-    
-    # Получаем все блокировки для этого узла
-    blocks = db.query(models.NodeBlock).filter(
-        models.NodeBlock.blocked_node_id == node_id
-    ).all()
-    
-    unavailable_reasons = []
-    
-    for block in blocks:
-        # Проверяем статус блокирующего узла
-        progress = db.query(models.Progress).filter(
-            models.Progress.user_id == user_id,
-            models.Progress.node_id == block.blocking_node_id
-        ).first()
-        
-        if not progress or progress.status != "completed":
-            if block.block_type == "required":
-                unavailable_reasons.append({
-                    "type": "required_block",
-                    "blocking_node": block.blocking_node.title,
-                    "blocking_node_id": block.blocking_node_id
-                })
-            else:
-                unavailable_reasons.append({
-                    "type": "optional_block",
-                    "blocking_node": block.blocking_node.title,
-                    "blocking_node_id": block.blocking_node_id
-                })
-    
+
+    unavailable_reasons = _unmet_blocks(db, [node_id], user_id).get(node_id, [])
     return {
         "available": len(unavailable_reasons) == 0,
         "reasons": unavailable_reasons,
@@ -385,17 +771,132 @@ def check_node_availability(db: Session, node_id: int, user_id: int) -> dict:
     }
 
 
+def get_direction_availability(db: Session, direction: str, user_id: int) -> List[schemas.NodeAvailabilityOut]:
+    """
+    Доступность всех узлов дерева направления для пользователя (в порядке обхода
+    от корней): блокировки и прогресс читаются одним запросом.
+    """
+    node_ids = graph_index.get(db).tree_nodes(direction)
+    reasons = _unmet_blocks(db, node_ids, user_id)
+    return [
+        schemas.NodeAvailabilityOut(
+            node_id=node_id,
+            available=node_id not in reasons,
+            reasons=reasons.get(node_id, []),
+        )
+        for node_id in node_ids
+    ]
+
+
+def get_node_plan(db: Session, node_id: int, user: models.User) -> Optional[schemas.NodePlanOut]:
+    """
+    Remaining prerequisites of a node for the user in the order they can be completed,
+    with the XP and badges each step would bring. Uses the cached graph, one progress
+    query and one query for the titles of the planned nodes.
+    Returns None if the node does not exist.
+    """
+    graph = graph_index.get(db)
+    if node_id not in graph:
+        return None
+    completed = {
+        completed_id for (completed_id,) in db.query(models.Progress.node_id).filter(
+            models.Progress.user_id == user.id, models.Progress.status == "completed"
+        )
+    }
+    step_ids = graph.plan(node_id, completed)
+    rows = {}
+    if step_ids:
+        rows = {
+            row.id: row
+            for row in db.query(models.RoadmapNode.id, models.RoadmapNode.title, models.RoadmapNode.checkpoint)
+            .filter(models.RoadmapNode.id.in_(step_ids))
+        }
+
+    xp = start_xp = user.xp or 0
+    badges = set(user.badges)
+    steps = []
+    for step_id in step_ids:
+        row = rows[step_id]
+        gained = completion_xp(bool(row.checkpoint))
+        xp += gained
+        new_badges = [name for name in badges_for(xp) if name not in badges]
+        badges.update(new_badges)
+        steps.append(schemas.PlanStepOut(
+            node_id=step_id,
+            title=row.title,
+            checkpoint=bool(row.checkpoint),
+            xp=gained,
+            projected_xp=xp,
+            new_badges=new_badges,
+        ))
+    return schemas.NodePlanOut(node_id=node_id, steps=steps, total_xp=xp - start_xp, projected_xp=xp)
+
+
+def get_badge_counts(db: Session) -> List[schemas.BadgeCountOut]:
+    """
+    Retrieves the number of users holding each badge, most common first.
+    """
+    count = func.count(models.UserBadge.id)
+    rows = (
+        db.query(models.UserBadge.badge, count)
+        .group_by(models.UserBadge.badge)
+        .order_by(count.desc(), models.UserBadge.badge)
+        .all()
+    )
+    return [schemas.BadgeCountOut(badge=badge, count=badge_count) for badge, badge_count in rows]
+
+
+def get_badge_holders(db: Session, badge: str, limit: int) -> List[schemas.BadgeHolderOut]:
+    """
+    Retrieves the users holding a badge, earliest first: a range scan
+    of the (badge, awarded_at) index joined to users by primary key.
+    """
+    rows = (
+        db.query(models.UserBadge.user_id, models.User.xp, models.UserBadge.awarded_at)
+        .join(models.User, models.User.id == models.UserBadge.user_id)
+        .filter(models.UserBadge.badge == badge)
+        .order_by(models.UserBadge.awarded_at, models.UserBadge.id)
+        .limit(limit)
+        .all()
+    )
+    return [
+        schemas.BadgeHolderOut(user_id=user_id, xp=xp, awarded_at=awarded_at)
+        for user_id, xp, awarded_at in rows
+    ]
+
+
+def get_users_availability(
+    db: Session, user_ids: List[int], direction: Optional[str] = None
+) -> List[schemas.UserAvailabilityOut]:
+    """
+    Открытые узлы (все обязательные блокировки завершены) для многих пользователей
+    сразу: проверка по битовым множествам в памяти, без запросов к progress.
+    """
+    bitsets = completion_index.get(db)
+    node_ids = graph_index.get(db).tree_nodes(direction) if direction is not None else None
+    availability = bitsets.availability(user_ids, node_ids)
+    return [
+        schemas.UserAvailabilityOut(user_id=user_id, available_node_ids=availability[user_id])
+        for user_id in dict.fromkeys(user_ids)
+    ]
+
+
 def create_node_block(db: Session, block: schemas.NodeBlockCreate) -> schemas.NodeBlockOut:
     """
     Создание блокировки между узлами.
     """
+    directions = _affected_directions(db, [block.blocking_node_id, block.blocked_node_id])
+    graph_index.get(db).check_block(block.blocking_node_id, block.blocked_node_id)
     db_block = models.NodeBlock(
         blocking_node_id=block.blocking_node_id,
         blocked_node_id=block.blocked_node_id,
         block_type=block.block_type
     )
     db.add(db_block)
+    db.flush()
+    refresh_unlocked(db, [block.blocked_node_id])
     db.commit()
+    roadmap_changed(directions)
     db.refresh(db_block)
     return schemas.NodeBlockOut.model_validate(db_block)
 
@@ -408,8 +909,13 @@ def delete_node_block(db: Session, block_id: int) -> bool:
     if not block:
         return False
     
+    directions = _affected_directions(db, [block.blocking_node_id, block.blocked_node_id])
+    blocked_node_id = block.blocked_node_id
     db.delete(block)
+    db.flush()
+    refresh_unlocked(db, [blocked_node_id])
     db.commit()
+    roadmap_changed(directions)
     return True
 
 
@@ -417,7 +923,7 @@ def get_all_nodes_with_blocks(db: Session) -> List[schemas.RoadmapNodeOut]:
     """
     Получение всех узлов с блокировками для админки.
     """
-    nodes = db.query(models.RoadmapNode).all()
+    nodes = load_nodes(db)
     return [schemas.RoadmapNodeOut.model_validate(node) for node in nodes]
 
 
@@ -428,5 +934,5 @@ def get_nodes_by_ids(db: Session, node_ids: List[int]) -> List[schemas.RoadmapNo
     if not node_ids:
         return []
     
-    nodes = db.query(models.RoadmapNode).filter(models.RoadmapNode.id.in_(node_ids)).all()
+    nodes = load_nodes(db, node_ids)
     return [schemas.RoadmapNodeOut.model_validate(node) for node in nodes]
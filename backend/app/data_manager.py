@@ -6,8 +6,11 @@ import json
 import os
 from typing import Dict, List, Optional
 from sqlalchemy.orm import Session
-from .models import RoadmapNode, User, Progress
+from .models import RoadmapNode, RoadmapNodeClosure, User, UserBadge, UserUnlockedNode, Progress
 from .auth import hash_password
+from .closure import rebuild_closure
+from .frontier import rebuild_unlocked
+from .crud import roadmap_changed
 
 
 class DataManager:
@@ -105,7 +108,7 @@ class DataManager:
                     direction=direction,
                     title=node_info["title"],
                     description=node_info["description"],
-                    resources=json.dumps(node_info["resources"]),
+                    resources=node_info["resources"],
                     checkpoint=node_info.get("checkpoint", False),
                 )
                 self.db.add(node)
@@ -135,7 +138,7 @@ class DataManager:
                 password_hash=hash_password(user_data["password"]),
                 role=user_data["role"],
                 xp=user_data["xp"],
-                badges=json.dumps(user_data["badges"])
+                badges=user_data["badges"]
             )
             self.db.add(user)
             created_users[user_data["email"]] = user
@@ -184,8 +187,11 @@ class DataManager:
         nodes = self.create_roadmap_nodes(roadmap_data)
         users = self.create_test_users(users_data)
         self.create_test_progress(progress_data, users, nodes)
+        rebuild_closure(self.db)
+        rebuild_unlocked(self.db)
         
         self.db.commit()
+        roadmap_changed()
         print("Database initialization complete with test users and progress.")
     
     def clear_data(self):
@@ -193,11 +199,15 @@ class DataManager:
         print("Clearing all data from database...")
         
         # Удаляем в правильном порядке (с учетом foreign keys)
+        self.db.query(UserUnlockedNode).delete()
         self.db.query(Progress).delete()
+        self.db.query(UserBadge).delete()
         self.db.query(User).delete()
+        self.db.query(RoadmapNodeClosure).delete()
         self.db.query(RoadmapNode).delete()
         
         self.db.commit()
+        roadmap_changed()
         print("Database cleared.")
     
     def export_data(self, output_dir: str = "data_export"):
@@ -221,7 +231,7 @@ class DataManager:
                 "key": node_key,
                 "title": node.title,
                 "description": node.description,
-                "resources": json.loads(node.resources) if node.resources else [],
+                "resources": node.resources or [],
                 "parents": [],  # TODO: восстановить связи
                 "checkpoint": node.checkpoint
             })
@@ -238,7 +248,7 @@ class DataManager:
                 "email": user.email,
                 "role": user.role,
                 "xp": user.xp,
-                "badges": json.loads(user.badges) if user.badges else []
+                "badges": list(user.badges)
             })
         
         with open(os.path.join(output_dir, "users.json"), 'w', encoding='utf-8') as f:
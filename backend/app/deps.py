@@ -8,6 +8,9 @@ from .models import User
 
 bearer_scheme = HTTPBearer(auto_error=False)
 
+# Роли с доступом к админским выгрузкам и данным других пользователей
+ADMIN_ROLES = {"lead"}
+
 
 def get_current_user(
     creds: HTTPAuthorizationCredentials | None = Depends(bearer_scheme),
@@ -23,3 +26,8 @@ def get_current_user(
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
     return user
 
+
+def get_current_admin_user(user: User = Depends(get_current_user)):
+    if user.role not in ADMIN_ROLES:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin privileges required")
+    return user
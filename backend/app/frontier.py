@@ -0,0 +1,74 @@
+"""
+Открытые пользователю узлы роадмапа (фронтир)
+
+Узел открыт, когда пользователь завершил все его обязательные блокирующие
+узлы. Узлы без обязательных блокировок открыты всем и берутся из индекса
+графа; в таблице user_unlocked_nodes хранятся только открытые узлы, у которых
+обязательные блокировки есть. Таблица обновляется в транзакции изменения
+прогресса или блокировок; пересчёт по одному пользователю идёт под блокировкой
+строки users, чтобы параллельные завершения разных блокирующих узлов видели
+прогресс друг друга.
+"""
+from typing import Iterable, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session, aliased
+
+from . import models
+
+REQUIRED = "required"
+
+
+def refresh_unlocked(db: Session, node_ids: Iterable[int], user_id: Optional[int] = None) -> None:
+    """
+    Пересчитывает строки user_unlocked_nodes для узлов (и одного пользователя,
+    если он указан) по текущему состоянию node_blocks и progress.
+
+    Вызывается после flush изменений, до commit. С user_id сначала берёт
+    SELECT ... FOR UPDATE на строку пользователя: при READ COMMITTED второй
+    пересчёт ждёт commit первого и следующим запросом видит его прогресс.
+    """
+    node_ids = list(node_ids)
+    if not node_ids:
+        return
+    if user_id is not None:
+        db.execute(select(models.User.id).where(models.User.id == user_id).with_for_update())
+    unlocked = models.UserUnlockedNode.__table__
+    block = models.NodeBlock
+    progress = models.Progress
+
+    delete = unlocked.delete().where(unlocked.c.node_id.in_(node_ids))
+    if user_id is not None:
+        delete = delete.where(unlocked.c.user_id == user_id)
+    db.execute(delete)
+
+    other = aliased(models.NodeBlock)
+    required_total = (
+        select(func.count(other.id))
+        .where(other.blocked_node_id == block.blocked_node_id, other.block_type == REQUIRED)
+        .scalar_subquery()
+    )
+    completed = (
+        select(progress.user_id, block.blocked_node_id)
+        .join(progress, progress.node_id == block.blocking_node_id)
+        .where(
+            block.block_type == REQUIRED,
+            block.blocked_node_id.in_(node_ids),
+            progress.status == "completed",
+        )
+        .group_by(progress.user_id, block.blocked_node_id)
+        .having(func.count(block.id) == required_total)
+    )
+    if user_id is not None:
+        completed = completed.where(progress.user_id == user_id)
+    db.execute(unlocked.insert().from_select(["user_id", "node_id"], completed))
+
+
+def rebuild_unlocked(db: Session) -> None:
+    """Полностью перестраивает user_unlocked_nodes"""
+    blocked_ids = [
+        node_id for (node_id,) in
+        db.query(models.NodeBlock.blocked_node_id).filter(models.NodeBlock.block_type == REQUIRED).distinct()
+    ]
+    db.query(models.UserUnlockedNode).delete(synchronize_session=False)
+    refresh_unlocked(db, blocked_ids)
@@ -0,0 +1,321 @@
+"""
+Индекс графа роадмапа в памяти процесса
+"""
+import heapq
+import threading
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from . import models
+
+
+class CycleError(Exception):
+    """Новая связь или блокировка замкнула бы цикл"""
+
+    def __init__(self, source_id: int, target_id: int, kind: str):
+        self.source_id = source_id
+        self.target_id = target_id
+        self.kind = kind
+        super().__init__(f"{kind.capitalize()} {source_id} -> {target_id} would create a cycle")
+
+
+class RoadmapGraph:
+    """Неизменяемый снимок графа: смежность, число родителей и корни по направлениям"""
+
+    def __init__(
+        self,
+        nodes: List[Tuple[int, str, int]],
+        links: List[Tuple[int, int]],
+        blocks: Iterable[Tuple[int, int, str]] = (),
+    ):
+        self.direction: Dict[int, str] = {}
+        self.order_key: Dict[int, Tuple[int, int]] = {}
+        for node_id, direction, order_index in nodes:
+            self.direction[node_id] = direction
+            self.order_key[node_id] = (order_index or 0, node_id)
+
+        self.children: Dict[int, List[int]] = {}
+        self.parents: Dict[int, List[int]] = {}
+        for source_id, target_id in links:
+            self.children.setdefault(source_id, []).append(target_id)
+            self.parents.setdefault(target_id, []).append(source_id)
+        for adjacency in (self.children, self.parents):
+            for ids in adjacency.values():
+                ids.sort(key=self._sort_key)
+
+        # Блокировки: блокирующий узел -> заблокированные им
+        self.blocked: Dict[int, List[int]] = {}
+        # Обратное направление: заблокированный узел -> блокирующие его
+        self.blockers: Dict[int, List[int]] = {}
+        # Только обязательные блокировки - они определяют, открыт ли узел
+        self.required_blocked: Dict[int, List[int]] = {}
+        self.required_blockers: Dict[int, List[int]] = {}
+        has_required_blocks: Set[int] = set()
+        for blocking_id, blocked_id, block_type in blocks:
+            self.blocked.setdefault(blocking_id, []).append(blocked_id)
+            self.blockers.setdefault(blocked_id, []).append(blocking_id)
+            if block_type == "required":
+                self.required_blocked.setdefault(blocking_id, []).append(blocked_id)
+                self.required_blockers.setdefault(blocked_id, []).append(blocking_id)
+                has_required_blocks.add(blocked_id)
+        # Узлы без обязательных блокировок открыты для всех пользователей
+        self.unblocked: List[int] = sorted(
+            (node_id for node_id in self.direction if node_id not in has_required_blocks), key=self._sort_key
+        )
+
+        # Родители из того же направления: узел под родителем из другого
+        # направления остаётся корнем своего
+        self.parent_count: Dict[int, int] = {
+            node_id: sum(1 for parent_id in ids if self.direction.get(parent_id) == self.direction.get(node_id))
+            for node_id, ids in self.parents.items()
+        }
+
+        self.directions: Set[str] = set(self.direction.values())
+        self.roots_by_direction: Dict[str, List[int]] = {}
+        for node_id in sorted(self.direction, key=self._sort_key):
+            if not self.parent_count.get(node_id):
+                self.roots_by_direction.setdefault(self.direction[node_id], []).append(node_id)
+
+    def _sort_key(self, node_id: int) -> Tuple[int, int]:
+        return self.order_key.get(node_id, (0, node_id))
+
+    @classmethod
+    def load(cls, db: Session) -> "RoadmapGraph":
+        """Строит граф тремя запросами: узлы, таблица связей и блокировки"""
+        nodes = db.query(
+            models.RoadmapNode.id,
+            models.RoadmapNode.direction,
+            models.RoadmapNode.order_index,
+        ).all()
+        links = db.query(
+            models.roadmap_node_links.c.source_id,
+            models.roadmap_node_links.c.target_id,
+        ).all()
+        blocks = db.query(
+            models.NodeBlock.blocking_node_id,
+            models.NodeBlock.blocked_node_id,
+            models.NodeBlock.block_type,
+        ).all()
+        return cls(
+            [tuple(row) for row in nodes],
+            [tuple(row) for row in links],
+            [tuple(row) for row in blocks],
+        )
+
+    def __contains__(self, node_id: int) -> bool:
+        return node_id in self.direction
+
+    def roots(self, direction: str) -> List[int]:
+        return self.roots_by_direction.get(direction, [])
+
+    def get_children(self, node_id: int) -> List[int]:
+        return self.children.get(node_id, [])
+
+    def get_parents(self, node_id: int) -> List[int]:
+        return self.parents.get(node_id, [])
+
+    def get_required_blocked(self, node_id: int) -> List[int]:
+        return self.required_blocked.get(node_id, [])
+
+    def prerequisites(self, node_id: int) -> List[Tuple[int, int]]:
+        """
+        Все узлы, блокирующие узел прямо или через цепочку блокировок:
+        (id, глубина), где глубина - длина кратчайшей цепочки; ближние первыми.
+        """
+        depths = {node_id: 0}
+        order = [node_id]
+        for current_id in order:
+            for blocking_id in self.blockers.get(current_id, ()):
+                if blocking_id not in depths:
+                    depths[blocking_id] = depths[current_id] + 1
+                    order.append(blocking_id)
+        return [(blocking_id, depths[blocking_id]) for blocking_id in order[1:]]
+
+    def descendants(self, start_ids: Iterable[int]) -> List[int]:
+        """Стартовые узлы и все их потомки, каждый ровно один раз (обход в ширину)"""
+        return self._walk(start_ids, self.children)
+
+    def ancestors(self, start_ids: Iterable[int]) -> List[int]:
+        """Стартовые узлы и все их предки, каждый ровно один раз (обход в ширину)"""
+        return self._walk(start_ids, self.parents)
+
+    def affected_directions(self, node_ids: Iterable[int]) -> Set[str]:
+        """Направления, в дерево корней которых входит хотя бы один из узлов"""
+        return {
+            self.direction[node_id]
+            for node_id in self.ancestors(node_ids)
+            if node_id in self.direction and not self.parent_count.get(node_id)
+        }
+
+    def tree_nodes(self, direction: str) -> List[int]:
+        """Узлы дерева направления: его корни и все их потомки (обход в ширину)"""
+        return self.descendants(self.roots(direction))
+
+    def layout(self, direction: str) -> List[Tuple[int, int, int]]:
+        """
+        Послойная раскладка дерева направления: (id, уровень, позиция в уровне)
+        в топологическом порядке.
+
+        Уровень - длина самого длинного пути от корня, так что узел всегда ниже
+        всех своих родителей. Среди готовых узлов первым идёт меньший
+        (order_index, id); внутри уровня узлы упорядочены по наименьшей
+        позиции родителя, затем по (order_index, id).
+        """
+        members = set(self.tree_nodes(direction))
+        pending = {
+            node_id: sum(1 for parent_id in self.get_parents(node_id) if parent_id in members)
+            for node_id in members
+        }
+        ready = [self._sort_key(node_id) for node_id, count in pending.items() if not count]
+        heapq.heapify(ready)
+
+        order: List[int] = []
+        level: Dict[int, int] = {}
+        while ready:
+            _, node_id = heapq.heappop(ready)
+            order.append(node_id)
+            del pending[node_id]
+            level[node_id] = max(
+                (level[parent_id] + 1 for parent_id in self.get_parents(node_id) if parent_id in level),
+                default=0,
+            )
+            for child_id in self.get_children(node_id):
+                if child_id in pending:
+                    pending[child_id] -= 1
+                    if not pending[child_id]:
+                        heapq.heappush(ready, self._sort_key(child_id))
+        # Узлы старых циклов (до проверки при записи) идут в конце
+        for node_id in sorted(pending, key=self._sort_key):
+            order.append(node_id)
+            level[node_id] = max(
+                (level[parent_id] + 1 for parent_id in self.get_parents(node_id) if parent_id in level),
+                default=0,
+            )
+
+        position: Dict[int, int] = {}
+        levels: Dict[int, List[int]] = {}
+        for node_id in order:
+            levels.setdefault(level[node_id], []).append(node_id)
+        for _, ids in sorted(levels.items()):
+            ids.sort(key=lambda node_id: (
+                min((position[p] for p in self.get_parents(node_id) if p in position), default=-1),
+                self._sort_key(node_id),
+            ))
+            for index, node_id in enumerate(ids):
+                position[node_id] = index
+        return [(node_id, level[node_id], position[node_id]) for node_id in order]
+
+    def _requirements(self, node_id: int) -> List[int]:
+        """Что нужно завершить до узла: родители и обязательные блокирующие узлы"""
+        return self.get_parents(node_id) + self.required_blockers.get(node_id, [])
+
+    def _dependents(self, node_id: int) -> List[int]:
+        return self.get_children(node_id) + self.get_required_blocked(node_id)
+
+    def plan(self, target_id: int, completed: Set[int]) -> List[int]:
+        """
+        Незавершённые узлы, без которых не добраться до target (включая его самого),
+        в топологическом порядке: каждый узел идёт после своих родителей
+        и обязательных блокирующих узлов. Обход не заходит за завершённые узлы.
+        """
+        if target_id in completed:
+            return []
+        members = {target_id}
+        stack = [target_id]
+        while stack:
+            for required_id in self._requirements(stack.pop()):
+                if required_id not in members and required_id not in completed:
+                    members.add(required_id)
+                    stack.append(required_id)
+
+        pending = {
+            node_id: sum(1 for required_id in self._requirements(node_id) if required_id in members)
+            for node_id in members
+        }
+        ready = [self._sort_key(node_id) for node_id, count in pending.items() if not count]
+        heapq.heapify(ready)
+        order: List[int] = []
+        while ready:
+            _, node_id = heapq.heappop(ready)
+            order.append(node_id)
+            del pending[node_id]
+            for dependent_id in self._dependents(node_id):
+                if dependent_id in pending:
+                    pending[dependent_id] -= 1
+                    if not pending[dependent_id]:
+                        heapq.heappush(ready, self._sort_key(dependent_id))
+        # Связи и блокировки вместе всё же могут образовать цикл - такие узлы в конце
+        order.extend(sorted(pending, key=self._sort_key))
+        return order
+
+    def check_link(self, parent_id: int, child_id: int) -> None:
+        """Бросает CycleError, если связь parent -> child замкнёт цикл"""
+        if self._reaches(child_id, parent_id, self.children):
+            raise CycleError(parent_id, child_id, "link")
+
+    def check_block(self, blocking_id: int, blocked_id: int) -> None:
+        """Бросает CycleError, если блокировка blocking -> blocked замкнёт цикл"""
+        if self._reaches(blocked_id, blocking_id, self.blocked):
+            raise CycleError(blocking_id, blocked_id, "block")
+
+    @staticmethod
+    def _reaches(start_id: int, target_id: int, adjacency: Dict[int, List[int]]) -> bool:
+        """
+        Достижим ли target из start. Граф ацикличен, поэтому новое ребро
+        target -> start замыкает цикл ровно тогда, когда это так; обход
+        затрагивает только потомков start и останавливается на первой находке.
+        """
+        if start_id == target_id:
+            return True
+        stack = [start_id]
+        seen = {start_id}
+        while stack:
+            for next_id in adjacency.get(stack.pop(), ()):
+                if next_id == target_id:
+                    return True
+                if next_id not in seen:
+                    seen.add(next_id)
+                    stack.append(next_id)
+        return False
+
+    @staticmethod
+    def _walk(start_ids: Iterable[int], adjacency: Dict[int, List[int]]) -> List[int]:
+        order = list(dict.fromkeys(start_ids))
+        seen = set(order)
+        for node_id in order:
+            for next_id in adjacency.get(node_id, ()):
+                if next_id not in seen:
+                    seen.add(next_id)
+                    order.append(next_id)
+        return order
+
+
+class GraphIndex:
+    """Лениво перестраиваемый кэш RoadmapGraph, общий для всего процесса"""
+
+    def __init__(self):
+        self._graph: Optional[RoadmapGraph] = None
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get(self, db: Session) -> RoadmapGraph:
+        graph = self._graph
+        if graph is not None:
+            return graph
+        with self._lock:
+            if self._graph is None:
+                generation = self._generation
+                graph = RoadmapGraph.load(db)
+                # Запись, случившаяся во время построения, делает снимок устаревшим
+                if generation == self._generation:
+                    self._graph = graph
+                return graph
+            return self._graph
+
+    def invalidate(self) -> None:
+        self._generation += 1
+        self._graph = None
+
+
+graph_index = GraphIndex()
@@ -0,0 +1,112 @@
+"""
+Пакетная загрузка узлов роадмапа без N+1 запросов
+
+Узлы и блокировки читаются фиксированным числом запросов, связи берутся из
+индекса графа, после чего relationships `children`, `blocked_by` и `blocks`
+заполняются в памяти, и сериализация больше не обращается к базе.
+"""
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import CTE, Integer, literal_column, select
+from sqlalchemy.orm import Session, load_only
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.sql import Select
+
+from . import models
+from .graph import graph_index
+
+
+def subtree_cte(root_ids: Iterable[int], max_depth: Optional[int] = None) -> CTE:
+    """
+    Рекурсивный CTE по roadmap_node_links: корни и все их потомки (до глубины
+    max_depth), колонка node_id. Работает в PostgreSQL и SQLite.
+
+    UNION, а не UNION ALL: строки схлопываются по (node_id[, depth]), поэтому
+    CTE держит не больше строки на узел (на узел и глубину при max_depth), а не
+    строку на каждый путь от корня, и завершается даже на старых циклах.
+    """
+    links = models.roadmap_node_links
+    node_id = models.RoadmapNode.id
+
+    if max_depth is None:
+        anchor = select(node_id.label("node_id")).where(node_id.in_(list(root_ids)))
+        tree = anchor.cte("subtree", recursive=True)
+        step = select(links.c.target_id).join(tree, links.c.source_id == tree.c.node_id)
+    else:
+        anchor = select(
+            node_id.label("node_id"),
+            literal_column("0", Integer).label("depth"),
+        ).where(node_id.in_(list(root_ids)))
+        tree = anchor.cte("subtree", recursive=True)
+        step = (
+            select(links.c.target_id, tree.c.depth + 1)
+            .join(tree, links.c.source_id == tree.c.node_id)
+            .where(tree.c.depth < max_depth)
+        )
+    return tree.union(step)
+
+
+def subtree_query(root_ids: Iterable[int], max_depth: Optional[int] = None) -> Select:
+    """ID корней и всех их потомков (до глубины max_depth), каждый один раз"""
+    tree = subtree_cte(root_ids, max_depth)
+    return select(tree.c.node_id).distinct()
+
+
+def load_nodes(
+    db: Session,
+    node_ids: Optional[Iterable[int]] = None,
+    max_depth: Optional[int] = None,
+    columns: Optional[Iterable[str]] = None,
+    with_blocks: bool = True,
+) -> List[models.RoadmapNode]:
+    """
+    Загружает узлы (все или по списку ID) вместе с поддеревьями и блокировками.
+
+    Возвращает запрошенные узлы в порядке ID; их потомки до глубины max_depth
+    тоже загружены и связаны, но в результат не входят. columns ограничивает
+    выбираемые колонки узлов, with_blocks=False пропускает запрос блокировок.
+    """
+    graph = graph_index.get(db)
+    node_query = db.query(models.RoadmapNode)
+    if columns is not None:
+        # id всегда в выборке, так что load_only не остаётся без аргументов
+        node_query = node_query.options(
+            load_only(models.RoadmapNode.id, *(getattr(models.RoadmapNode, column) for column in columns))
+        )
+    block_query = db.query(models.NodeBlock)
+    if node_ids is not None:
+        requested = set(node_ids)
+        if not requested:
+            return []
+        closure = subtree_query(sorted(requested), max_depth)
+        node_query = node_query.filter(models.RoadmapNode.id.in_(closure))
+        block_query = block_query.filter(
+            models.NodeBlock.blocked_node_id.in_(closure)
+            | models.NodeBlock.blocking_node_id.in_(closure)
+        )
+    else:
+        requested = None
+
+    nodes = node_query.order_by(models.RoadmapNode.id).all()
+    nodes_by_id: Dict[int, models.RoadmapNode] = {node.id: node for node in nodes}
+
+    blocked_by: Dict[int, List[models.NodeBlock]] = {}
+    blocks: Dict[int, List[models.NodeBlock]] = {}
+    if with_blocks:
+        for block in block_query.order_by(models.NodeBlock.id).all():
+            blocked_by.setdefault(block.blocked_node_id, []).append(block)
+            blocks.setdefault(block.blocking_node_id, []).append(block)
+
+    for node in nodes:
+        set_committed_value(node, "children", [
+            nodes_by_id[child_id]
+            for child_id in graph.get_children(node.id)
+            if child_id in nodes_by_id
+        ])
+        if with_blocks:
+            set_committed_value(node, "blocked_by", blocked_by.get(node.id, []))
+            set_committed_value(node, "blocks", blocks.get(node.id, []))
+
+    if requested is None:
+        return nodes
+    return [node for node in nodes if node.id in requested]
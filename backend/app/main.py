@@ -3,8 +3,10 @@ from datetime import datetime
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy import text
+from .compression import CompressionMiddleware
 from .db import Base, engine, SessionLocal
 from .models import *  # noqa: F401
+from .responses import get_response_class
 from .routers import auth as auth_router
 from .routers import roadmap as roadmap_router
 from .routers import progress as progress_router
@@ -12,7 +14,9 @@ from .routers import team as team_router
 from .routers import corporate as corporate_router
 from .routers import user as user_router
 from .routers import admin as admin_router
+from .routers import export as export_router
 from .seed import seed
+from .settings import settings
 
 
 @asynccontextmanager
@@ -30,7 +34,11 @@ async def lifespan(app: FastAPI):
     pass
 
 
-app = FastAPI(title="Gamified Roadmap Platform (MVP)", lifespan=lifespan)
+app = FastAPI(
+    title="Gamified Roadmap Platform (MVP)",
+    lifespan=lifespan,
+    default_response_class=get_response_class(settings.json_response_class),
+)
 
 app.add_middleware(
     CORSMiddleware,
@@ -38,7 +46,9 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor", "X-Total-Count"],
 )
+app.add_middleware(CompressionMiddleware, minimum_size=settings.compression_min_size)
 
 
 app.include_router(auth_router.router)
@@ -48,6 +58,7 @@ app.include_router(team_router.router)
 app.include_router(corporate_router.router)
 app.include_router(user_router.router)
 app.include_router(admin_router.router)
+app.include_router(export_router.router)
 
 
 @app.get("/")
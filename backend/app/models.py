@@ -1,9 +1,15 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Text, Boolean, UniqueConstraint, Table, DateTime
+from sqlalchemy import Column, Integer, String, ForeignKey, Text, Boolean, UniqueConstraint, Table, DateTime, Index, JSON
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.associationproxy import association_proxy
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .db import Base
 
 
+# JSONB в PostgreSQL, JSON (текст) в SQLite для тестов
+JSONValue = JSON().with_variant(JSONB(), "postgresql")
+
+
 # Association Table for many-to-many relationship between RoadmapNodes
 roadmap_node_links = Table(
     'roadmap_node_links',
@@ -20,9 +26,25 @@ class User(Base):
     password_hash = Column(String(255), nullable=False)
     role = Column(String(50), default="intern", nullable=False)
     xp = Column(Integer, default=0, nullable=False)
-    badges = Column(Text, default="[]", nullable=False)  # JSON string for MVP
 
     progress = relationship("Progress", back_populates="user", cascade="all, delete-orphan")
+    badge_rows = relationship("UserBadge", order_by="UserBadge.id", cascade="all, delete-orphan")
+    # Названия бейджей в порядке выдачи; присваивание списка создаёт строки user_badges
+    badges = association_proxy("badge_rows", "badge", creator=lambda badge: UserBadge(badge=badge))
+
+
+class UserBadge(Base):
+    __tablename__ = "user_badges"
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    badge = Column(String(50), nullable=False)
+    awarded_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    # Уникальность обслуживает бейджи пользователя, индекс - выборки по бейджу
+    __table_args__ = (
+        UniqueConstraint("user_id", "badge", name="uq_user_badges_user_badge"),
+        Index("ix_user_badges_badge_awarded_at", "badge", "awarded_at"),
+    )
 
 
 class RoadmapNode(Base):
@@ -31,7 +53,7 @@ class RoadmapNode(Base):
     direction = Column(String(50), index=True, nullable=False)  # backend, frontend, devops, etc.
     title = Column(String(255), nullable=False)
     description = Column(Text, default="")
-    resources = Column(Text, default="[]")  # JSON string
+    resources = Column(JSONValue, default=list)
     checkpoint = Column(Boolean, default=False)
     
     # Новые поля для админки
@@ -55,6 +77,27 @@ class RoadmapNode(Base):
     blocked_by = relationship("NodeBlock", foreign_keys="NodeBlock.blocked_node_id", back_populates="blocked_node")
     blocks = relationship("NodeBlock", foreign_keys="NodeBlock.blocking_node_id", back_populates="blocking_node")
 
+    # Ключ keyset-пагинации каталога узлов
+    __table_args__ = (Index("ix_roadmap_nodes_direction_order_id", "direction", "order_index", "id"),)
+
+
+class RoadmapNodeClosure(Base):
+    """Транзитивное замыкание roadmap_node_links: каждый предок каждого узла (и сам узел с depth=0)"""
+    __tablename__ = "roadmap_node_closure"
+    ancestor_id = Column(Integer, ForeignKey("roadmap_nodes.id"), primary_key=True)
+    descendant_id = Column(Integer, ForeignKey("roadmap_nodes.id"), primary_key=True)
+    depth = Column(Integer, nullable=False)  # длина кратчайшего пути от предка
+
+    # Первичный ключ обслуживает поиск потомков, этот индекс - поиск предков
+    __table_args__ = (Index("ix_roadmap_node_closure_descendant_ancestor", "descendant_id", "ancestor_id"),)
+
+
+class UserUnlockedNode(Base):
+    """Узел с обязательными блокировками, все блокирующие узлы которого пользователь завершил"""
+    __tablename__ = "user_unlocked_nodes"
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    node_id = Column(Integer, ForeignKey("roadmap_nodes.id"), primary_key=True)
+
 
 class Profession(Base):
     __tablename__ = "professions"
@@ -0,0 +1,103 @@
+"""
+Классы ответов: JSON по умолчанию для всего приложения и MessagePack по Accept
+"""
+from typing import Any, Callable, Tuple, Type
+
+import msgpack
+import orjson
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+from pydantic_core import to_json, to_jsonable_python
+
+JSON_MEDIA_TYPE = "application/json"
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+MSGPACK_MEDIA_TYPES = (MSGPACK_MEDIA_TYPE, "application/x-msgpack")
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON через orjson: в разы быстрее стандартного json на больших деревьях
+    роадмапа. datetime (NodeBlockOut.created_at) сериализуется в ISO 8601.
+    """
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+class MsgPackResponse(Response):
+    """
+    MessagePack с теми же данными, что и JSON-ответ: FastAPI передаёт сюда
+    уже приведённые к JSON-типам данные (datetime - строкой ISO 8601).
+    """
+    media_type = MSGPACK_MEDIA_TYPE
+
+    def render(self, content) -> bytes:
+        return msgpack.packb(content, use_bin_type=True)
+
+
+RESPONSE_CLASSES = {
+    "orjson": FastJSONResponse,
+    "json": JSONResponse,
+}
+
+
+def get_response_class(name: str) -> Type[JSONResponse]:
+    """
+    Класс ответа по имени из настроек.
+    """
+    if name not in RESPONSE_CLASSES:
+        raise ValueError(f"Unknown JSON response class: {name}")
+    return RESPONSE_CLASSES[name]
+
+
+def accepts_msgpack(request: Request) -> bool:
+    """Клиент явно просит MessagePack; иначе отвечаем JSON"""
+    accept = request.headers.get("accept", "")
+    return any(
+        part.split(";")[0].strip().lower() in MSGPACK_MEDIA_TYPES
+        for part in accept.split(",")
+    )
+
+
+def encode_payload(payload: Any, request: Request) -> Tuple[bytes, str]:
+    """Кодирует payload (модели, списки, dict) в формат, выбранный по Accept: (тело, media type)"""
+    if accepts_msgpack(request):
+        return msgpack.packb(to_jsonable_python(payload), use_bin_type=True), MSGPACK_MEDIA_TYPE
+    return to_json(payload), JSON_MEDIA_TYPE
+
+
+def add_vary_accept(response: Response) -> None:
+    vary = response.headers.get("vary")
+    if not vary:
+        response.headers["Vary"] = "Accept"
+    elif "accept" not in [value.strip().lower() for value in vary.split(",")]:
+        response.headers["Vary"] = f"{vary}, Accept"
+
+
+class NegotiatedRoute(APIRoute):
+    """
+    Маршрут, отдающий MessagePack при Accept: application/msgpack.
+
+    Валидация и сериализация по response_model общие; различается только
+    класс ответа, поэтому обработчик собирается дважды.
+    """
+
+    def get_route_handler(self) -> Callable:
+        json_handler = super().get_route_handler()
+        response_class = self.response_class
+        self.response_class = MsgPackResponse
+        try:
+            msgpack_handler = super().get_route_handler()
+        finally:
+            self.response_class = response_class
+
+        async def handler(request: Request) -> Response:
+            if accepts_msgpack(request):
+                response = await msgpack_handler(request)
+            else:
+                response = await json_handler(request)
+            add_vary_accept(response)
+            return response
+
+        return handler
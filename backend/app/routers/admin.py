@@ -1,24 +1,50 @@
-from typing import List
+from typing import List, Literal, Optional, Union
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy.orm import Session
 
 from .. import crud, schemas, deps
+from ..cache import rendered_cache
 from ..db import get_db
+from ..graph import CycleError
+from ..responses import NegotiatedRoute
+from ..settings import settings
+from .roadmap import NodeView, list_all_nodes
 
 router = APIRouter(
     prefix="/admin/roadmap",
     tags=["admin-roadmap"],
+    route_class=NegotiatedRoute,
     # dependencies=[Depends(deps.get_current_admin_user)]  # TODO: добавить проверку админа
 )
 
 
-@router.get("/nodes", response_model=List[schemas.RoadmapNodeOut])
-def get_all_nodes_admin(db: Session = Depends(get_db)):
+@router.get("/nodes", response_model=Union[List[schemas.RoadmapNodeOut], schemas.RoadmapGraphOut])
+def get_all_nodes_admin(
+    request: Request,
+    response: Response,
+    response_format: Literal["tree", "graph"] = Query("tree", alias="format"),
+    limit: Optional[int] = Query(None, ge=1, le=settings.roadmap_max_page_size),
+    cursor: Optional[str] = None,
+    view: NodeView = Depends(),
+    db: Session = Depends(get_db),
+):
     """
     Получение всех узлов для админки.
+    ?format=graph возвращает плоский граф без повторов поддеревьев.
+    ?limit= и ?cursor= включают постраничную выдачу, курсор следующей
+    страницы передаётся в заголовке X-Next-Cursor.
+    ?fields= и ?depth= ограничивают поля узлов и глубину вложенности.
     """
-    return crud.get_all_nodes_with_blocks(db)
+    return list_all_nodes(request, response, db, response_format, limit, cursor, view)
+
+
+@router.get("/cache")
+def get_cache_stats():
+    """
+    Статистика кэша отрисованных ответов роадмапа.
+    """
+    return rendered_cache.stats()
 
 
 @router.post("/nodes/by-ids", response_model=List[schemas.RoadmapNodeOut])
@@ -50,6 +76,8 @@ def update_node_admin(node_id: int, node: schemas.RoadmapNodeCreate, db: Session
     """
     try:
         return crud.update_node_with_blocks(db, node_id, node)
+    except CycleError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
@@ -67,11 +95,17 @@ def delete_node_admin(node_id: int, db: Session = Depends(get_db)):
     return {"message": "Node deleted successfully"}
 
 
-@router.get("/nodes/{node_id}/dependencies", response_model=List[schemas.RoadmapNodeOut])
-def get_node_dependencies(node_id: int, db: Session = Depends(get_db)):
+@router.get(
+    "/nodes/{node_id}/dependencies",
+    response_model=Union[List[schemas.RoadmapNodeOut], List[schemas.RoadmapNodeRelativeOut]],
+)
+def get_node_dependencies(node_id: int, transitive: bool = False, db: Session = Depends(get_db)):
     """
     Получение зависимостей узла.
+    С ?transitive=true - вся цепочка блокирующих узлов с глубиной, без вложенных детей.
     """
+    if transitive:
+        return crud.get_transitive_dependencies(db, node_id)
     return crud.get_node_dependencies(db, node_id)
 
 
@@ -83,6 +117,23 @@ def check_node_availability(node_id: int, user_id: int, db: Session = Depends(ge
     return crud.check_node_availability(db, node_id, user_id)
 
 
+@router.get(
+    "/availability",
+    response_model=List[schemas.UserAvailabilityOut],
+    dependencies=[Depends(deps.get_current_admin_user)],
+)
+def get_users_availability(
+    user_ids: List[int] = Query(..., min_length=1),
+    direction: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    """
+    Открытые узлы для списка пользователей (?user_ids=1&user_ids=2),
+    при указании direction - только узлы его дерева.
+    """
+    return crud.get_users_availability(db, user_ids, direction)
+
+
 @router.post("/blocks", response_model=schemas.NodeBlockOut)
 def create_block(block: schemas.NodeBlockCreate, db: Session = Depends(get_db)):
     """
@@ -90,6 +141,8 @@ def create_block(block: schemas.NodeBlockCreate, db: Session = Depends(get_db)):
     """
     try:
         return crud.create_node_block(db, block)
+    except CycleError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -4,7 +4,6 @@ from ..db import get_db
 from ..models import User
 from ..schemas import UserCreate, LoginRequest, Token, UserOut
 from ..auth import hash_password, verify_password, create_jwt
-import json
 from ..deps import get_current_user
 from pydantic import ValidationError
 
@@ -41,7 +40,7 @@ def register(payload: UserCreate, db: Session = Depends(get_db)):
         password_hash=hash_password(payload.password),
         role=payload.role,
         xp=0,
-        badges=json.dumps([]),
+        badges=[],
     )
     db.add(user)
     db.commit()
@@ -52,7 +51,7 @@ def register(payload: UserCreate, db: Session = Depends(get_db)):
         email=user.email,
         role=user.role,
         xp=user.xp,
-        badges=json.loads(user.badges),
+        badges=list(user.badges),
     )
 
 
@@ -88,12 +87,10 @@ def login(payload: LoginRequest, db: Session = Depends(get_db)):
 @router.get("/me", response_model=UserOut)
 def me(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     user = db.query(User).get(current_user.id)
-    import json as _json
-
     return UserOut(
         id=user.id,
         email=user.email,
         role=user.role,
         xp=user.xp,
-        badges=_json.loads(user.badges or "[]"),
+        badges=list(user.badges),
     )
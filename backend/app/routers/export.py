@@ -0,0 +1,104 @@
+import json
+from typing import Any, Callable, Dict, Iterator
+
+from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
+
+from .. import deps, models
+from ..db import get_db
+
+router = APIRouter(
+    prefix="/admin/export",
+    tags=["admin-export"],
+    dependencies=[Depends(deps.get_current_admin_user)],
+)
+
+# Строк на одну порцию серверного курсора и один чанк ответа
+EXPORT_BATCH_SIZE = 1000
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def _ndjson_stream(db: Session, statement: Select, to_dict: Callable[[Row], Dict[str, Any]]) -> Iterator[bytes]:
+    """
+    Читает строки серверным курсором порциями по EXPORT_BATCH_SIZE и отдаёт
+    каждую порцию отдельным чанком NDJSON. Следующая порция читается только
+    после того, как клиент принял предыдущую, так что память не растёт.
+    """
+    try:
+        result = db.execute(statement.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        for rows in result.partitions():
+            yield "".join(
+                json.dumps(to_dict(row), ensure_ascii=False, separators=(",", ":")) + "\n"
+                for row in rows
+            ).encode("utf-8")
+    finally:
+        # Поток дочитывается уже после выхода из обработчика
+        db.close()
+
+
+def _ndjson_response(db: Session, statement: Select, to_dict: Callable[[Row], Dict[str, Any]]) -> StreamingResponse:
+    return StreamingResponse(_ndjson_stream(db, statement, to_dict), media_type=NDJSON_MEDIA_TYPE)
+
+
+def _node_to_dict(row: Row) -> Dict[str, Any]:
+    data = row._asdict()
+    data["resources"] = row.resources or []
+    return data
+
+
+def _block_to_dict(row: Row) -> Dict[str, Any]:
+    data = row._asdict()
+    data["created_at"] = row.created_at.isoformat()
+    return data
+
+
+@router.get("/nodes")
+def export_nodes(db: Session = Depends(get_db)):
+    """
+    Потоковая выгрузка всех узлов в NDJSON.
+    """
+    node = models.RoadmapNode
+    statement = select(
+        node.id, node.direction, node.title, node.description, node.resources,
+        node.checkpoint, node.node_type, node.is_required, node.order_index, node.is_active,
+    ).order_by(node.id)
+    return _ndjson_response(db, statement, _node_to_dict)
+
+
+@router.get("/edges")
+def export_edges(db: Session = Depends(get_db)):
+    """
+    Потоковая выгрузка связей родитель -> ребёнок в NDJSON.
+    """
+    links = models.roadmap_node_links
+    statement = select(links.c.source_id, links.c.target_id).order_by(links.c.source_id, links.c.target_id)
+    return _ndjson_response(db, statement, Row._asdict)
+
+
+@router.get("/blocks")
+def export_blocks(db: Session = Depends(get_db)):
+    """
+    Потоковая выгрузка блокировок в NDJSON.
+    """
+    block = models.NodeBlock
+    statement = select(
+        block.id, block.blocking_node_id, block.blocked_node_id, block.block_type, block.created_at,
+    ).order_by(block.id)
+    return _ndjson_response(db, statement, _block_to_dict)
+
+
+@router.get("/progress")
+def export_progress(db: Session = Depends(get_db)):
+    """
+    Потоковая выгрузка прогресса всех пользователей в NDJSON.
+    """
+    progress = models.Progress
+    statement = select(
+        progress.user_id, progress.node_id, progress.status, progress.score,
+    ).order_by(progress.user_id, progress.node_id)
+    return _ndjson_response(db, statement, Row._asdict)
@@ -1,24 +1,101 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import update
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.orm import Session
-from typing import List
+from typing import Dict, List, Tuple
+from .. import crud
+from ..bitsets import completion_index
 from ..db import get_db
-from ..models import Progress, RoadmapNode, User
-from ..schemas import ProgressUpdate, ProgressOut
+from ..models import Progress, RoadmapNode, User, UserBadge
+from ..schemas import BadgeCountOut, BadgeHolderOut, ProgressUpdate, ProgressOut
 from ..deps import get_current_user
-import json
+from ..frontier import refresh_unlocked
+from ..graph import graph_index
+from ..responses import NegotiatedRoute
+from ..xp import badges_for, completion_xp
 
 
-router = APIRouter(prefix="/progress", tags=["progress"])
+router = APIRouter(prefix="/progress", tags=["progress"], route_class=NegotiatedRoute)
 
 
-def _award_xp_and_badges(user: User, delta_xp: int):
-    user.xp += max(0, delta_xp)
-    badges = json.loads(user.badges or "[]")
-    thresholds = [(100, "Apprentice"), (300, "Journeyman"), (600, "Adept"), (1000, "Master")]
-    for t, name in thresholds:
-        if user.xp >= t and name not in badges:
-            badges.append(name)
-    user.badges = json.dumps(badges)
+def _dialect_insert(db: Session):
+    return postgresql.insert if db.get_bind().dialect.name == "postgresql" else sqlite.insert
+
+
+def _insert_badges(db: Session, user_id: int, badges: List[str]) -> None:
+    """Вставляет бейджи пользователя, пропуская уже выданные (ON CONFLICT DO NOTHING)"""
+    db.execute(
+        _dialect_insert(db)(UserBadge).on_conflict_do_nothing(index_elements=["user_id", "badge"]),
+        [{"user_id": user_id, "badge": badge} for badge in badges],
+    )
+
+
+def _award_xp_and_badges(db: Session, user: User, delta_xp: int) -> int:
+    """
+    Начисляет XP на стороне БД одним UPDATE ... RETURNING, без чтения-изменения-записи
+    в Python, так что параллельные завершения не теряют XP. Все бейджи, положенные
+    по возвращённому XP, вставляются в user_badges с пропуском уже выданных, поэтому
+    недостающие бейджи (например, после импорта XP) тоже выдаются. Возвращает новый XP.
+    """
+    delta_xp = max(0, delta_xp)
+    xp = db.execute(
+        update(User)
+        .where(User.id == user.id)
+        .values(xp=User.xp + delta_xp)
+        .returning(User.xp)
+    ).scalar_one()
+    earned = badges_for(xp)
+    if earned:
+        _insert_badges(db, user.id, earned)
+        db.expire(user, ["badge_rows"])
+    return xp
+
+
+def _ensure_progress(db: Session, user_id: int, node_ids: List[int]) -> None:
+    """Создаёт недостающие строки progress; параллельная вставка той же строки пропускается"""
+    db.execute(
+        _dialect_insert(db)(Progress).on_conflict_do_nothing(index_elements=["user_id", "node_id"]),
+        [{"user_id": user_id, "node_id": node_id, "status": "not_started", "score": 0} for node_id in node_ids],
+    )
+
+
+def _apply_update(db: Session, user_id: int, payload: ProgressUpdate, node: RoadmapNode) -> Tuple[bool, int]:
+    """
+    Записывает статус и оценку. Смена завершённости - условный UPDATE ... RETURNING:
+    из параллельных запросов, завершающих один узел, строку меняет только один,
+    и только он получает XP. Возвращает (сменилась ли завершённость, XP).
+    """
+    progress = Progress.__table__
+    row = (progress.c.user_id == user_id, progress.c.node_id == payload.node_id)
+    completed = payload.status == "completed"
+    transition = progress.c.status != "completed" if completed else progress.c.status == "completed"
+    values = {"status": payload.status, "score": payload.score}
+    changed = db.execute(
+        update(progress).where(*row, transition).values(**values).returning(progress.c.node_id)
+    ).first() is not None
+    if not changed:
+        db.execute(update(progress).where(*row).values(**values))
+    if changed and completed:
+        return True, completion_xp(node.checkpoint, payload.score)
+    return changed, 0
+
+
+def _progress_rows(db: Session, user_id: int, node_ids: List[int]) -> Dict[int, Progress]:
+    rows = (
+        db.query(Progress)
+        .filter(Progress.user_id == user_id, Progress.node_id.in_(node_ids))
+        .populate_existing()
+    )
+    return {prog.node_id: prog for prog in rows}
+
+
+def _completion_changed(db: Session, user_id: int, node_ids: List[int]) -> None:
+    """Открытость меняется только у узлов, которые изменённые узлы обязательно блокируют"""
+    graph = graph_index.get(db)
+    db.flush()
+    refresh_unlocked(
+        db, {blocked_id for node_id in node_ids for blocked_id in graph.get_required_blocked(node_id)}, user_id=user_id
+    )
 
 
 @router.post("/update", response_model=ProgressOut)
@@ -31,30 +108,63 @@ def update_progress(
     if not node:
         raise HTTPException(status_code=404, detail="Node not found")
 
-    prog = (
-        db.query(Progress)
-        .filter(Progress.user_id == current_user.id, Progress.node_id == node.id)
-        .first()
-    )
-    if not prog:
-        prog = Progress(user_id=current_user.id, node_id=node.id)
-        db.add(prog)
+    _ensure_progress(db, current_user.id, [node.id])
+    changed, gained_xp = _apply_update(db, current_user.id, payload, node)
+    if gained_xp:
+        _award_xp_and_badges(db, current_user, gained_xp)
+    if changed:
+        _completion_changed(db, current_user.id, [node.id])
 
-    completed_before = prog.status == "completed"
-    prog.status = payload.status
-    prog.score = payload.score
+    result = ProgressOut.model_validate(_progress_rows(db, current_user.id, [node.id])[node.id])
+    db.commit()
+    if changed:
+        completion_index.set_completed(current_user.id, node.id, result.status == "completed")
+    return result
 
-    # XP rule: completing a node grants base XP; checkpoint grants extra
-    base_xp = 20
-    extra_checkpoint = 30 if node.checkpoint else 0
-    score_bonus = max(0, min(payload.score, 100)) // 10  # up to +10
 
-    if payload.status == "completed" and not completed_before:
-        _award_xp_and_badges(current_user, base_xp + extra_checkpoint + score_bonus)
+@router.post("/batch", response_model=List[ProgressOut])
+def update_progress_batch(
+    payload: List[ProgressUpdate],
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Applies many progress updates in order, as consecutive /progress/update calls
+    would, in one transaction: nodes are loaded with one query, each update is a
+    conditional UPDATE, XP and badges are awarded once for the whole batch.
+    Returns the resulting progress of each distinct node, in first-seen order.
+    """
+    if not payload:
+        return []
+    node_ids = list(dict.fromkeys(item.node_id for item in payload))
+    nodes = {node.id: node for node in db.query(RoadmapNode).filter(RoadmapNode.id.in_(node_ids))}
+    missing = [node_id for node_id in node_ids if node_id not in nodes]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Nodes not found: {', '.join(map(str, missing))}")
+
+    _ensure_progress(db, current_user.id, node_ids)
+    changed = set()
+    gained_xp = 0
+    for item in payload:
+        item_changed, item_xp = _apply_update(db, current_user.id, item, nodes[item.node_id])
+        if item_changed:
+            changed.add(item.node_id)
+        gained_xp += item_xp
 
+    if gained_xp:
+        _award_xp_and_badges(db, current_user, gained_xp)
+    changed = [node_id for node_id in node_ids if node_id in changed]
+    if changed:
+        _completion_changed(db, current_user.id, changed)
+
+    # Ответ собирается до commit, чтобы не перечитывать каждую строку после expire
+    rows = _progress_rows(db, current_user.id, node_ids)
+    result = [ProgressOut.model_validate(rows[node_id]) for node_id in node_ids]
     db.commit()
-    db.refresh(prog)
-    return ProgressOut.model_validate(prog)
+    for item in result:
+        if item.node_id in changed:
+            completion_index.set_completed(item.user_id, item.node_id, item.status == "completed")
+    return result
 
 
 @router.get("/mine", response_model=List[ProgressOut])
@@ -62,3 +172,26 @@ def my_progress(db: Session = Depends(get_db), current_user: User = Depends(get_
     rows = db.query(Progress).filter(Progress.user_id == current_user.id).all()
     return [ProgressOut.model_validate(p) for p in rows]
 
+
+
+@router.get("/frontier", response_model=List[int])
+def my_frontier(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    """IDs of nodes the current user can work on: every required blocker is completed."""
+    return crud.get_user_frontier(db, current_user.id)
+
+
+@router.get("/badges", response_model=List[BadgeCountOut])
+def badge_counts(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    """Number of users holding each badge, most common first."""
+    return crud.get_badge_counts(db)
+
+
+@router.get("/badges/{badge}", response_model=List[BadgeHolderOut])
+def badge_holders(
+    badge: str,
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Users holding a badge, in the order they earned it."""
+    return crud.get_badge_holders(db, badge, limit)
@@ -1,55 +1,299 @@
-from typing import List
+from typing import Any, Callable, List, Literal, Optional, Union
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy.orm import Session
 
 from .. import crud, models, schemas
+from ..cache import ALL_SCOPE, cached_response, check_not_modified, direction_scope, encoded_response
+from ..responses import NegotiatedRoute
 from ..db import get_db
+from ..deps import get_current_user
+from ..graph import graph_index
+from ..settings import settings
 
 router = APIRouter(
     prefix="/roadmap",
     tags=["roadmap"],
+    route_class=NegotiatedRoute,
 )
 
 
-@router.get("/", response_model=List[schemas.RoadmapNodeOut])
-def read_roadmap_nodes(db: Session = Depends(get_db)):
+class NodeView:
+    """
+    Sparse fieldset and depth requested via ?fields= and ?depth=.
+    """
+
+    def __init__(
+        self,
+        fields: Optional[str] = Query(None, description="Comma-separated node fields, e.g. title,direction"),
+        depth: Optional[int] = Query(None, ge=0, le=schemas.MAX_TREE_DEPTH, description="Levels of nested children"),
+    ):
+        try:
+            self.fields = schemas.parse_node_fields(fields)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        self.depth = depth
+
+    @property
+    def is_sparse(self) -> bool:
+        return self.fields is not None or self.depth is not None
+
+    @property
+    def sparse_depth(self) -> int:
+        return schemas.MAX_TREE_DEPTH if self.depth is None else self.depth
+
+    @property
+    def cache_variant(self) -> str:
+        fields = "*" if self.fields is None else ",".join(sorted(self.fields))
+        return f"sparse:{fields}:{self.sparse_depth}"
+
+    def check_format(self, response_format: str) -> None:
+        if self.is_sparse and response_format == "graph":
+            raise HTTPException(status_code=400, detail="fields and depth are not supported with format=graph")
+
+
+def direction_response(
+    db: Session,
+    direction: str,
+    variant: str,
+    render: Callable[[], Any],
+    request: Request,
+    response: Response,
+) -> Response:
+    """
+    Cached response for a direction. Unknown directions are rendered but not
+    cached, so arbitrary names in the URL cannot fill the rendered cache.
+    """
+    return cached_response(
+        direction_scope(direction), variant, render, request, response,
+        cache_if=lambda: direction in graph_index.get(db).directions,
+    )
+
+
+def list_all_nodes(
+    request: Request,
+    response: Response,
+    db: Session,
+    response_format: str,
+    limit: Optional[int],
+    cursor: Optional[str],
+    view: NodeView,
+):
+    """
+    Shared implementation of /roadmap/ and /admin/roadmap/nodes.
+    """
+    not_modified = check_not_modified(request, response)
+    if not_modified:
+        return not_modified
+    view.check_format(response_format)
+    if limit is not None or cursor is not None:
+        try:
+            page, next_cursor = crud.get_roadmap_page(
+                db, limit or settings.roadmap_page_size, cursor, response_format, view.fields, view.depth
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+        return encoded_response(page, request, response)
+    if view.is_sparse:
+        return cached_response(
+            ALL_SCOPE, view.cache_variant,
+            lambda: crud.get_sparse_nodes(db, None, view.fields, view.sparse_depth), request, response,
+        )
+    if response_format == "graph":
+        return cached_response(ALL_SCOPE, "graph", lambda: crud.get_roadmap_graph(db), request, response)
+    return cached_response(ALL_SCOPE, "tree", lambda: crud.get_all_nodes(db), request, response)
+
+
+@router.get("/", response_model=Union[List[schemas.RoadmapNodeOut], schemas.RoadmapGraphOut])
+def read_roadmap_nodes(
+    request: Request,
+    response: Response,
+    response_format: Literal["tree", "graph"] = Query("tree", alias="format"),
+    limit: Optional[int] = Query(None, ge=1, le=settings.roadmap_max_page_size),
+    cursor: Optional[str] = None,
+    view: NodeView = Depends(),
+    db: Session = Depends(get_db),
+):
     """
     Retrieve all roadmap nodes.
+    With ?format=graph every node is returned once, with edges and blocks listed separately.
+    With ?limit= and/or ?cursor= nodes are paged by (direction, order_index, id);
+    the next page cursor is sent in the X-Next-Cursor header.
+    With ?fields= and/or ?depth= nodes contain only the listed fields (id is always
+    present) and children nested up to the given depth.
     """
-    nodes = crud.get_all_nodes(db)
-    return nodes
+    return list_all_nodes(request, response, db, response_format, limit, cursor, view)
 
 
 @router.get("/directions", response_model=List[str])
-def get_directions(db: Session = Depends(get_db)):
+def get_directions(request: Request, response: Response, db: Session = Depends(get_db)):
     """
     Get all available directions.
     """
+    not_modified = check_not_modified(request, response)
+    if not_modified:
+        return not_modified
     directions = db.query(models.RoadmapNode.direction).distinct().all()
     return [d[0] for d in directions]
 
 
-@router.get("/directions/{direction}", response_model=List[schemas.RoadmapNodeOut])
-def get_nodes_by_direction(direction: str, db: Session = Depends(get_db)):
+@router.get("/directions/{direction}", response_model=Union[List[schemas.RoadmapNodeOut], schemas.RoadmapGraphOut])
+def get_nodes_by_direction(
+    direction: str,
+    request: Request,
+    response: Response,
+    response_format: Literal["tree", "graph"] = Query("tree", alias="format"),
+    view: NodeView = Depends(),
+    db: Session = Depends(get_db),
+):
     """
     Get root nodes for a specific direction with their children hierarchy.
+    With ?format=graph the roots and their descendants are returned as a flat graph.
+    Supports ?fields= and ?depth= like the full roadmap listing.
     """
-    nodes = crud.get_root_nodes_by_direction(db, direction)
-    return nodes
+    not_modified = check_not_modified(request, response)
+    if not_modified:
+        return not_modified
+    view.check_format(response_format)
+    if view.is_sparse:
+        return direction_response(
+            db, direction, view.cache_variant,
+            lambda: crud.get_sparse_nodes(db, crud.get_root_node_ids(db, direction), view.fields, view.sparse_depth),
+            request, response,
+        )
+    if response_format == "graph":
+        return direction_response(db, direction, "graph", lambda: crud.get_roadmap_graph(db, direction), request, response)
+    return direction_response(
+        db, direction, "tree", lambda: crud.get_root_nodes_by_direction(db, direction), request, response,
+    )
+
+
+@router.get("/directions/{direction}/layout", response_model=schemas.RoadmapLayoutOut)
+def get_direction_layout(direction: str, request: Request, response: Response, db: Session = Depends(get_db)):
+    """
+    Get a precomputed layered layout of a direction: nodes in topological order,
+    each with its longest-path level and position within the level.
+    Cached per direction and recomputed only after writes that touch it.
+    """
+    not_modified = check_not_modified(request, response)
+    if not_modified:
+        return not_modified
+    return direction_response(
+        db, direction, "layout", lambda: crud.get_direction_layout(db, direction), request, response,
+    )
+
+
+@router.get("/directions/{direction}/availability", response_model=List[schemas.NodeAvailabilityOut])
+def get_direction_availability(
+    direction: str,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """
+    Get lock/unlock state for every node of a direction for the current user,
+    with the blocking nodes that are not completed yet.
+    """
+    return crud.get_direction_availability(db, direction, current_user.id)
+
+
+@router.get("/node/{node_id}/plan", response_model=schemas.NodePlanOut)
+def get_node_plan(
+    node_id: int,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """
+    Get what the current user still has to complete to reach a node: required
+    blockers and parents, transitively, in topological order with estimated XP.
+    """
+    plan = crud.get_node_plan(db, node_id, current_user)
+    if plan is None:
+        raise HTTPException(status_code=404, detail="Node not found")
+    return plan
 
 
 @router.get("/node/{node_id}", response_model=schemas.RoadmapNodeOut)
-def get_node(node_id: int, db: Session = Depends(get_db)):
+def get_node(
+    node_id: int,
+    request: Request,
+    response: Response,
+    view: NodeView = Depends(),
+    db: Session = Depends(get_db),
+):
     """
     Get a specific node by ID.
+    Supports ?fields= and ?depth= like the full roadmap listing.
     """
+    not_modified = check_not_modified(request, response)
+    if not_modified:
+        return not_modified
+    if view.is_sparse:
+        nodes = crud.get_sparse_nodes(db, [node_id], view.fields, view.sparse_depth)
+        if not nodes:
+            raise HTTPException(status_code=404, detail="Node not found")
+        return encoded_response(nodes[0], request, response)
     node = crud.get_node(db, node_id)
     if not node:
         raise HTTPException(status_code=404, detail="Node not found")
     return node
 
 
+@router.get("/node/{node_id}/children", response_model=List[schemas.RoadmapNodeChildOut])
+def get_node_children(
+    node_id: int,
+    request: Request,
+    response: Response,
+    limit: int = Query(settings.roadmap_page_size, ge=1, le=settings.roadmap_max_page_size),
+    offset: int = Query(0, ge=0),
+    depth: int = Query(1, ge=1, le=schemas.MAX_TREE_DEPTH),
+    db: Session = Depends(get_db),
+):
+    """
+    Get a page of a node's children for incremental tree loading.
+    Every child has a has_children flag; ?depth= nests grandchildren up to that depth.
+    The total number of children is sent in the X-Total-Count header.
+    """
+    not_modified = check_not_modified(request, response)
+    if not_modified:
+        return not_modified
+    result = crud.get_node_children(db, node_id, limit, offset, depth)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Node not found")
+    children, total = result
+    response.headers["X-Total-Count"] = str(total)
+    return encoded_response(children, request, response)
+
+
+@router.get("/node/{node_id}/ancestors", response_model=List[schemas.RoadmapNodeRelativeOut])
+def get_node_ancestors(node_id: int, request: Request, response: Response, db: Session = Depends(get_db)):
+    """
+    Get all ancestors of a node, nearest first, each with its distance in depth.
+    """
+    not_modified = check_not_modified(request, response)
+    if not_modified:
+        return not_modified
+    ancestors = crud.get_node_ancestors(db, node_id)
+    if ancestors is None:
+        raise HTTPException(status_code=404, detail="Node not found")
+    return ancestors
+
+
+@router.get("/node/{node_id}/descendants", response_model=List[schemas.RoadmapNodeRelativeOut])
+def get_node_descendants(node_id: int, request: Request, response: Response, db: Session = Depends(get_db)):
+    """
+    Get all descendants of a node, nearest first, each with its distance in depth.
+    """
+    not_modified = check_not_modified(request, response)
+    if not_modified:
+        return not_modified
+    descendants = crud.get_node_descendants(db, node_id)
+    if descendants is None:
+        raise HTTPException(status_code=404, detail="Node not found")
+    return descendants
+
+
 @router.post("/", response_model=schemas.RoadmapNodeOut)
 def create_roadmap_node(node: schemas.RoadmapNodeCreate, db: Session = Depends(get_db)):
     """
@@ -1,4 +1,5 @@
-from pydantic import BaseModel, EmailStr, validator, Field
+import json
+from pydantic import BaseModel, EmailStr, validator, field_validator, Field
 from typing import List, Optional, Literal
 from datetime import datetime
 
@@ -39,6 +40,19 @@ class LoginRequest(BaseModel):
 
 # --- Roadmap Schemas ---
 
+# Глубина, на которой RoadmapNodeOut обрезает вложенных детей
+MAX_TREE_DEPTH = 10
+
+def _decode_resources(value) -> list:
+    """Колонка хранит список; строка JSON встречается только у объектов не из ORM"""
+    if isinstance(value, str):
+        try:
+            return json.loads(value)
+        except json.JSONDecodeError:
+            return []
+    return value or []
+
+
 class RoadmapNodeBase(BaseModel):
     title: str
     description: Optional[str] = ""
@@ -51,6 +65,27 @@ class RoadmapNodeBase(BaseModel):
     is_active: bool = True
 
 
+# Поля узла, доступные в ?fields=; id возвращается всегда
+NODE_COLUMN_FIELDS = (
+    "title", "description", "direction", "resources", "checkpoint",
+    "node_type", "is_required", "order_index", "is_active",
+)
+NODE_BLOCK_FIELDS = ("blocked_by", "blocks")
+
+
+def parse_node_fields(raw: Optional[str]) -> Optional[List[str]]:
+    """
+    Разбирает ?fields=title,direction в список полей; None - все поля.
+    """
+    if raw is None:
+        return None
+    fields = [field.strip() for field in raw.split(",") if field.strip()]
+    unknown = [field for field in fields if field != "id" and field not in NODE_COLUMN_FIELDS + NODE_BLOCK_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return [field for field in dict.fromkeys(fields) if field != "id"]
+
+
 class RoadmapNodeCreate(RoadmapNodeBase):
     parent_ids: Optional[List[int]] = []
     blocking_node_ids: Optional[List[int]] = []  # узлы, которые блокируют этот
@@ -68,66 +103,102 @@ class RoadmapNodeOut(RoadmapNodeBase):
 
     @classmethod
     def model_validate(cls, obj, **kwargs):
-        # Get visited set from kwargs or create new one
+        """
+        Спуск по DAG: узел, общий для нескольких родителей, выводится целиком
+        один раз за вызов (visited), а в остальных местах - заглушкой без детей,
+        ресурсов и блокировок, чтобы размер ответа не рос экспоненциально.
+        path - узлы текущей ветки; он отбрасывает обратные рёбра в данных,
+        записанных до появления проверки циклов (graph.CycleError).
+        """
         visited = kwargs.get('visited', set())
-        max_depth = kwargs.get('max_depth', 10)
+        max_depth = kwargs.get('max_depth', MAX_TREE_DEPTH)
         current_depth = kwargs.get('current_depth', 0)
-        
-        # Prevent infinite recursion - check before adding to visited
-        if obj.id in visited or current_depth >= max_depth:
-            return cls(
-                id=obj.id,
-                title=obj.title,
-                description=obj.description or "",
-                direction=obj.direction,
-                resources=[],
-                checkpoint=obj.checkpoint,
-                node_type=getattr(obj, 'node_type', 'task'),
-                is_required=getattr(obj, 'is_required', True),
-                order_index=getattr(obj, 'order_index', 0),
-                is_active=getattr(obj, 'is_active', True),
-                children=[],
-                blocked_by=[],
-                blocks=[]
-            )
-        
-        # Add current node to visited set BEFORE processing children
+        path = kwargs.get('path', set())
+
+        fields = dict(
+            id=obj.id,
+            title=obj.title,
+            description=obj.description or "",
+            direction=obj.direction,
+            checkpoint=obj.checkpoint,
+            node_type=getattr(obj, 'node_type', 'task'),
+            is_required=getattr(obj, 'is_required', True),
+            order_index=getattr(obj, 'order_index', 0),
+            is_active=getattr(obj, 'is_active', True),
+        )
+        if obj.id in visited:
+            return cls(**fields, resources=[], children=[], blocked_by=[], blocks=[])
         visited.add(obj.id)
-        
-        # Convert JSON string resources to list
-        import json
-        if hasattr(obj, 'resources') and obj.resources:
-            try:
-                resources = json.loads(obj.resources) if isinstance(obj.resources, str) else obj.resources
-            except (json.JSONDecodeError, TypeError):
-                resources = []
-        else:
-            resources = []
-        
-        # Create data dict with converted resources
-        data = {
-            "id": obj.id,
-            "title": obj.title,
-            "description": obj.description or "",
-            "direction": obj.direction,
-            "resources": resources,
-            "checkpoint": obj.checkpoint,
-            "node_type": getattr(obj, 'node_type', 'task'),
-            "is_required": getattr(obj, 'is_required', True),
-            "order_index": getattr(obj, 'order_index', 0),
-            "is_active": getattr(obj, 'is_active', True),
-            "children": [
+
+        children = []
+        if current_depth < max_depth:
+            path.add(obj.id)
+            children = [
                 cls.model_validate(
-                    child, 
-                    visited=visited, 
-                    max_depth=max_depth, 
-                    current_depth=current_depth + 1
-                ) for child in obj.children
-            ] if hasattr(obj, 'children') else [],
-            "blocked_by": [NodeBlockOut.model_validate(block) for block in obj.blocked_by] if hasattr(obj, 'blocked_by') else [],
-            "blocks": [NodeBlockOut.model_validate(block) for block in obj.blocks] if hasattr(obj, 'blocks') else []
-        }
-        return cls(**data)
+                    child, visited=visited, path=path, max_depth=max_depth, current_depth=current_depth + 1
+                )
+                for child in obj.children
+                if child.id not in path
+            ]
+            path.discard(obj.id)
+
+        return cls(
+            **fields,
+            resources=_decode_resources(getattr(obj, 'resources', None)),
+            children=children,
+            blocked_by=[NodeBlockOut.model_validate(block) for block in obj.blocked_by],
+            blocks=[NodeBlockOut.model_validate(block) for block in obj.blocks],
+        )
+
+
+class RoadmapNodeFlatOut(RoadmapNodeBase):
+    """Узел без вложенных детей и блокировок для формата format=graph"""
+    id: int
+
+    model_config = {
+        "from_attributes": True
+    }
+
+    @field_validator('resources', mode='before')
+    @classmethod
+    def decode_resources(cls, v):
+        return _decode_resources(v)
+
+
+class RoadmapNodeChildOut(RoadmapNodeFlatOut):
+    """Ребёнок узла для ленивой подгрузки дерева"""
+    has_children: bool
+    children: List['RoadmapNodeChildOut'] = []
+
+
+class RoadmapNodeRelativeOut(RoadmapNodeFlatOut):
+    """Предок или потомок узла с расстоянием до него"""
+    depth: int
+
+
+class RoadmapLayoutNodeOut(BaseModel):
+    id: int
+    level: int     # длина самого длинного пути от корня
+    position: int  # порядок внутри уровня
+
+
+class RoadmapLayoutOut(BaseModel):
+    """Готовая послойная раскладка направления; nodes в топологическом порядке"""
+    direction: str
+    level_count: int
+    nodes: List[RoadmapLayoutNodeOut]
+
+
+class RoadmapEdgeOut(BaseModel):
+    source_id: int
+    target_id: int
+
+
+class RoadmapGraphOut(BaseModel):
+    """Плоский граф: каждый узел один раз, связи и блокировки отдельными списками"""
+    nodes: List[RoadmapNodeFlatOut]
+    edges: List[RoadmapEdgeOut]
+    blocks: List['NodeBlockOut']
 
 
 class ProgressUpdate(BaseModel):
@@ -147,6 +218,51 @@ class ProgressOut(BaseModel):
     }
 
 
+class AvailabilityReasonOut(BaseModel):
+    type: Literal["required_block", "optional_block"]
+    blocking_node: str
+    blocking_node_id: int
+
+
+class NodeAvailabilityOut(BaseModel):
+    node_id: int
+    available: bool
+    reasons: List[AvailabilityReasonOut] = []
+
+
+class PlanStepOut(BaseModel):
+    node_id: int
+    title: str
+    checkpoint: bool
+    xp: int
+    projected_xp: int
+    new_badges: List[str] = []
+
+
+class NodePlanOut(BaseModel):
+    """Что осталось завершить до узла; XP оценивается без бонуса за оценку"""
+    node_id: int
+    steps: List[PlanStepOut]
+    total_xp: int
+    projected_xp: int
+
+
+class BadgeCountOut(BaseModel):
+    badge: str
+    count: int
+
+
+class BadgeHolderOut(BaseModel):
+    user_id: int
+    xp: int
+    awarded_at: datetime
+
+
+class UserAvailabilityOut(BaseModel):
+    user_id: int
+    available_node_ids: List[int]
+
+
 # --- Team & Corporate Schemas ---
 
 class TeamStats(BaseModel):
@@ -209,3 +325,7 @@ class NodeBlockOut(BaseModel):
 
 class NodeIdsRequest(BaseModel):
     node_ids: List[int]
+
+
+RoadmapGraphOut.model_rebuild()
+RoadmapNodeChildOut.model_rebuild()
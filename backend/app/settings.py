@@ -14,6 +14,13 @@ class Settings(BaseSettings):
     debug: bool = True
     cors_origins: list = ["http://localhost:3000", "http://localhost:5173"]
     log_level: str = "INFO"
+    roadmap_cache_max_bytes: int = 32 * 1024 * 1024
+    roadmap_page_size: int = 100
+    roadmap_max_page_size: int = 1000
+    # orjson или json
+    json_response_class: str = "orjson"
+    # Ответы короче этого размера не сжимаются
+    compression_min_size: int = 1024
 
     class Config:
         env_file = "../.env"
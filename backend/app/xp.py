@@ -0,0 +1,25 @@
+"""
+Правила начисления XP и бейджей
+"""
+from bisect import bisect_right
+from typing import List
+
+BASE_XP = 20
+CHECKPOINT_XP = 30
+
+# По возрастанию порога: бейджи ищутся бинарным поиском по _THRESHOLD_XP
+BADGE_THRESHOLDS = [(100, "Apprentice"), (300, "Journeyman"), (600, "Adept"), (1000, "Master")]
+_THRESHOLD_XP = [threshold for threshold, _ in BADGE_THRESHOLDS]
+
+
+def completion_xp(checkpoint: bool, score: int = 0) -> int:
+    """XP за первое завершение узла"""
+    extra_checkpoint = CHECKPOINT_XP if checkpoint else 0
+    score_bonus = max(0, min(score, 100)) // 10  # up to +10
+    return BASE_XP + extra_checkpoint + score_bonus
+
+
+def badges_for(xp: int) -> List[str]:
+    """Бейджи, положенные при данном XP, по возрастанию порога"""
+    return [name for _, name in BADGE_THRESHOLDS[:bisect_right(_THRESHOLD_XP, xp)]]
+
@@ -0,0 +1,77 @@
+"""add_user_badges
+
+Revision ID: a8b1c3d5e7f9
+Revises: f3a9d2e5b8c4
+Create Date: 2026-10-17 19:42:08.517316
+
+"""
+import json
+from datetime import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a8b1c3d5e7f9'
+down_revision: Union[str, Sequence[str], None] = 'f3a9d2e5b8c4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _badge_list(value):
+    # JSONB приходит списком, JSON в SQLite - текстом
+    if isinstance(value, str):
+        value = json.loads(value or '[]')
+    return value or []
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    user_badges = op.create_table('user_badges',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('badge', sa.String(length=50), nullable=False),
+    sa.Column('awarded_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id', 'badge', name='uq_user_badges_user_badge')
+    )
+    op.create_index('ix_user_badges_badge_awarded_at', 'user_badges', ['badge', 'awarded_at'], unique=False)
+
+    # Перенос из JSON-колонки с сохранением порядка выдачи
+    bind = op.get_bind()
+    now = datetime.utcnow()
+    rows = [
+        {'user_id': user_id, 'badge': badge, 'awarded_at': now}
+        for user_id, badges in bind.execute(sa.text('SELECT id, badges FROM users ORDER BY id'))
+        for badge in dict.fromkeys(_badge_list(badges))
+    ]
+    if rows:
+        op.bulk_insert(user_badges, rows)
+
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.drop_column('badges')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    json_type = postgresql.JSONB() if op.get_bind().dialect.name == 'postgresql' else sa.JSON()
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.add_column(sa.Column('badges', json_type, nullable=True))
+
+    bind = op.get_bind()
+    badges = {}
+    for user_id, badge in bind.execute(sa.text('SELECT user_id, badge FROM user_badges ORDER BY id')):
+        badges.setdefault(user_id, []).append(badge)
+    users = sa.table('users', sa.column('id', sa.Integer()), sa.column('badges', json_type))
+    for (user_id,) in bind.execute(sa.text('SELECT id FROM users')):
+        bind.execute(users.update().where(users.c.id == user_id).values(badges=badges.get(user_id, [])))
+
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.alter_column('badges', existing_type=json_type, nullable=False)
+
+    op.drop_index('ix_user_badges_badge_awarded_at', table_name='user_badges')
+    op.drop_table('user_badges')
@@ -0,0 +1,29 @@
+"""add_roadmap_nodes_keyset_index
+
+Revision ID: c4e1f2a7b903
+Revises: aa3c695d9636
+Create Date: 2026-10-17 10:12:41.208315
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4e1f2a7b903'
+down_revision: Union[str, Sequence[str], None] = 'aa3c695d9636'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Составной индекс для keyset-пагинации по (direction, order_index, id)
+    op.create_index('ix_roadmap_nodes_direction_order_id', 'roadmap_nodes', ['direction', 'order_index', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_roadmap_nodes_direction_order_id', table_name='roadmap_nodes')
@@ -0,0 +1,61 @@
+"""add_roadmap_node_closure
+
+Revision ID: d7a3b5c91e42
+Revises: c4e1f2a7b903
+Create Date: 2026-10-17 12:40:05.517204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd7a3b5c91e42'
+down_revision: Union[str, Sequence[str], None] = 'c4e1f2a7b903'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    closure = op.create_table('roadmap_node_closure',
+    sa.Column('ancestor_id', sa.Integer(), nullable=False),
+    sa.Column('descendant_id', sa.Integer(), nullable=False),
+    sa.Column('depth', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['ancestor_id'], ['roadmap_nodes.id'], ),
+    sa.ForeignKeyConstraint(['descendant_id'], ['roadmap_nodes.id'], ),
+    sa.PrimaryKeyConstraint('ancestor_id', 'descendant_id')
+    )
+    op.create_index('ix_roadmap_node_closure_descendant_ancestor', 'roadmap_node_closure', ['descendant_id', 'ancestor_id'], unique=False)
+
+    # Заполняем замыкание по существующим связям: BFS от каждого узла к его предкам
+    bind = op.get_bind()
+    parents = {}
+    for source_id, target_id in bind.execute(sa.text('SELECT source_id, target_id FROM roadmap_node_links')):
+        parents.setdefault(target_id, []).append(source_id)
+    rows = []
+    for (node_id,) in bind.execute(sa.text('SELECT id FROM roadmap_nodes')):
+        depths = {node_id: 0}
+        frontier = [node_id]
+        while frontier:
+            next_frontier = []
+            for current_id in frontier:
+                for parent_id in parents.get(current_id, ()):
+                    if parent_id not in depths:
+                        depths[parent_id] = depths[current_id] + 1
+                        next_frontier.append(parent_id)
+            frontier = next_frontier
+        rows.extend(
+            {'ancestor_id': ancestor_id, 'descendant_id': node_id, 'depth': depth}
+            for ancestor_id, depth in depths.items()
+        )
+    if rows:
+        op.bulk_insert(closure, rows)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_roadmap_node_closure_descendant_ancestor', table_name='roadmap_node_closure')
+    op.drop_table('roadmap_node_closure')
@@ -0,0 +1,64 @@
+"""json_columns_for_resources_and_badges
+
+Revision ID: e2f8c4d6a1b7
+Revises: d7a3b5c91e42
+Create Date: 2026-10-17 14:05:22.913604
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2f8c4d6a1b7'
+down_revision: Union[str, Sequence[str], None] = 'd7a3b5c91e42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (таблица, колонка, nullable)
+COLUMNS = [
+    ('roadmap_nodes', 'resources', True),
+    ('users', 'badges', False),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Пустые строки и NULL - не JSON; приводим к пустому списку на обоих диалектах
+    for table, column, _ in COLUMNS:
+        op.execute(f"UPDATE {table} SET {column} = '[]' WHERE {column} IS NULL OR {column} = ''")
+
+    if op.get_bind().dialect.name == 'postgresql':
+        for table, column, nullable in COLUMNS:
+            op.alter_column(
+                table, column,
+                existing_type=sa.Text(),
+                type_=postgresql.JSONB(),
+                existing_nullable=nullable,
+                postgresql_using=f"{column}::jsonb",
+            )
+    else:
+        # В SQLite JSON хранится тем же текстом, меняется только объявленный тип
+        for table, column, nullable in COLUMNS:
+            with op.batch_alter_table(table) as batch_op:
+                batch_op.alter_column(column, existing_type=sa.Text(), type_=sa.JSON(), existing_nullable=nullable)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name == 'postgresql':
+        for table, column, nullable in COLUMNS:
+            op.alter_column(
+                table, column,
+                existing_type=postgresql.JSONB(),
+                type_=sa.Text(),
+                existing_nullable=nullable,
+                postgresql_using=f"{column}::text",
+            )
+    else:
+        for table, column, nullable in COLUMNS:
+            with op.batch_alter_table(table) as batch_op:
+                batch_op.alter_column(column, existing_type=sa.JSON(), type_=sa.Text(), existing_nullable=nullable)
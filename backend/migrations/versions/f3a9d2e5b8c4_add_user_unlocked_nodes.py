@@ -0,0 +1,47 @@
+"""add_user_unlocked_nodes
+
+Revision ID: f3a9d2e5b8c4
+Revises: e2f8c4d6a1b7
+Create Date: 2026-10-17 16:21:47.380126
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3a9d2e5b8c4'
+down_revision: Union[str, Sequence[str], None] = 'e2f8c4d6a1b7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('user_unlocked_nodes',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('node_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['node_id'], ['roadmap_nodes.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'node_id')
+    )
+    # Узлы, у которых пользователь завершил все обязательные блокирующие узлы
+    op.execute("""
+        INSERT INTO user_unlocked_nodes (user_id, node_id)
+        SELECT p.user_id, b.blocked_node_id
+        FROM node_blocks b
+        JOIN progress p ON p.node_id = b.blocking_node_id
+        WHERE b.block_type = 'required' AND p.status = 'completed'
+        GROUP BY p.user_id, b.blocked_node_id
+        HAVING COUNT(b.id) = (
+            SELECT COUNT(*) FROM node_blocks b2
+            WHERE b2.blocked_node_id = b.blocked_node_id AND b2.block_type = 'required'
+        )
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('user_unlocked_nodes')
@@ -0,0 +1,77 @@
+"""
+Тесты closure-таблицы иерархии роадмапа.
+"""
+from app import crud, schemas
+from app.closure import rebuild_closure
+from app.models import RoadmapNode, RoadmapNodeClosure
+
+
+def _create(db_session, title, parent_ids=()):
+    return crud.create_node_with_blocks(
+        db_session,
+        schemas.RoadmapNodeCreate(title=title, direction="backend", parent_ids=list(parent_ids)),
+    )
+
+
+def _closure(db_session):
+    return {
+        (row.ancestor_id, row.descendant_id): row.depth
+        for row in db_session.query(RoadmapNodeClosure).all()
+    }
+
+
+def test_closure_is_maintained_on_create_update_delete(db_session):
+    root = _create(db_session, "root")
+    middle = _create(db_session, "middle", [root.id])
+    leaf = _create(db_session, "leaf", [middle.id])
+    other = _create(db_session, "other")
+
+    assert _closure(db_session) == {
+        (root.id, root.id): 0, (middle.id, middle.id): 0, (leaf.id, leaf.id): 0, (other.id, other.id): 0,
+        (root.id, middle.id): 1, (middle.id, leaf.id): 1, (root.id, leaf.id): 2,
+    }
+
+    # Перенос поддерева под другой корень пересчитывает предков всех потомков
+    crud.update_node_with_blocks(
+        db_session, middle.id,
+        schemas.RoadmapNodeCreate(title="middle", direction="backend", parent_ids=[other.id]),
+    )
+    closure = _closure(db_session)
+    assert (root.id, leaf.id) not in closure
+    assert closure[(other.id, leaf.id)] == 2
+
+    crud.delete_node_cascade(db_session, middle.id)
+    assert _closure(db_session) == {
+        (root.id, root.id): 0, (leaf.id, leaf.id): 0, (other.id, other.id): 0,
+    }
+
+
+def test_ancestor_and_descendant_lookups(client, db_session):
+    root = _create(db_session, "root")
+    left = _create(db_session, "left", [root.id])
+    right = _create(db_session, "right", [root.id])
+    leaf = _create(db_session, "leaf", [left.id, right.id])
+
+    response = client.get(f"/roadmap/node/{leaf.id}/ancestors")
+    assert response.status_code == 200
+    assert [(node["id"], node["depth"]) for node in response.json()] == [
+        (left.id, 1), (right.id, 1), (root.id, 2),
+    ]
+
+    response = client.get(f"/roadmap/node/{root.id}/descendants")
+    assert [(node["id"], node["depth"]) for node in response.json()] == [
+        (left.id, 1), (right.id, 1), (leaf.id, 2),
+    ]
+
+    assert client.get("/roadmap/node/99999/ancestors").status_code == 404
+
+
+def test_rebuild_closure_matches_links(db_session):
+    root = RoadmapNode(direction="backend", title="root", resources=[])
+    child = RoadmapNode(direction="backend", title="child", resources=[])
+    root.children.append(child)
+    db_session.add_all([root, child])
+    db_session.commit()
+
+    assert rebuild_closure(db_session) == 3
+    assert _closure(db_session) == {(root.id, root.id): 0, (child.id, child.id): 0, (root.id, child.id): 1}
@@ -0,0 +1,126 @@
+"""
+Тесты сжатия ответов и сжатых записей кэша.
+"""
+import gzip
+
+from app.cache import rendered_cache
+from app.compression import choose_encoding
+from app.models import RoadmapNode
+
+
+def _big_roadmap(db_session, count=50):
+    root = RoadmapNode(direction="backend", title="Root", description="Root " * 50, resources=[])
+    for i in range(count):
+        root.children.append(RoadmapNode(
+            direction="backend", title=f"Node {i}", description="Long description " * 10, resources=[],
+        ))
+    db_session.add(root)
+    db_session.commit()
+    return root.id
+
+
+def test_choose_encoding(monkeypatch):
+    monkeypatch.setattr("app.compression.brotli", None)
+    assert choose_encoding("gzip, deflate, br") == "gzip"
+    assert choose_encoding("gzip;q=0, deflate") is None
+    assert choose_encoding("*") == "gzip"
+    assert choose_encoding("gzip;q=0, *") is None
+    assert choose_encoding("br, *;q=0.5") == "gzip"
+    assert choose_encoding(None) is None
+
+    monkeypatch.setattr("app.compression.brotli", object())
+    assert choose_encoding("gzip, br") == "br"
+    assert choose_encoding("br;q=0.5, gzip") == "gzip"
+    assert choose_encoding("br;q=0, *") == "gzip"
+
+
+def test_large_responses_are_gzipped_and_small_are_not(client, db_session):
+    root_id = _big_roadmap(db_session)
+
+    response = client.post("/admin/roadmap/nodes/by-ids", json={"node_ids": [root_id]}, headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["vary"]
+
+    small = client.get("/", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in small.headers
+    plain = client.post("/admin/roadmap/nodes/by-ids", json={"node_ids": [root_id]}, headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+    assert plain.json() == response.json()
+
+
+def test_cached_responses_keep_compressed_bytes(client, db_session, monkeypatch):
+    monkeypatch.setattr("app.compression.brotli", None)
+    _big_roadmap(db_session)
+    rendered_cache.invalidate()
+
+    first = client.get("/roadmap/directions/backend", headers={"Accept-Encoding": "gzip"})
+    assert first.headers["content-encoding"] == "gzip"
+    bodies = rendered_cache.get(("direction:backend", "tree", "application/json"))
+    assert set(bodies) == {"identity", "gzip"}
+    assert gzip.decompress(bodies["gzip"]) == bodies["identity"]
+
+    calls = []
+    monkeypatch.setattr("app.cache.compress", lambda body, encoding: calls.append(encoding) or b"")
+    second = client.get("/roadmap/directions/backend", headers={"Accept-Encoding": "gzip"})
+    assert calls == []
+    assert second.json() == first.json()
+
+
+def test_streaming_export_is_compressed(client, db_session, admin_headers):
+    _big_roadmap(db_session)
+    response = client.get("/admin/export/nodes", headers={**admin_headers, "Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert len(response.text.splitlines()) == 51
+
+
+def test_etag_and_vary_depend_on_encoding(client, db_session, monkeypatch):
+    monkeypatch.setattr("app.compression.brotli", None)
+    _big_roadmap(db_session)
+
+    compressed = client.get("/roadmap/directions/backend", headers={"Accept-Encoding": "gzip"})
+    plain = client.get("/roadmap/directions/backend", headers={"Accept-Encoding": "identity"})
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert "content-encoding" not in plain.headers
+    assert compressed.headers["etag"] != plain.headers["etag"]
+    assert compressed.headers["vary"] == plain.headers["vary"] == "Accept, Accept-Encoding"
+
+    not_modified = client.get(
+        "/roadmap/directions/backend",
+        headers={"Accept-Encoding": "gzip", "If-None-Match": compressed.headers["etag"]},
+    )
+    assert not_modified.status_code == 304
+    assert not_modified.headers["etag"] == compressed.headers["etag"]
+    assert not_modified.headers["vary"] == compressed.headers["vary"]
+
+    # Маленькое тело не сжимается и идёт с ETag без суффикса кодировки
+    small = client.get("/roadmap/directions/frontend", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in small.headers
+    assert small.headers["etag"] == client.get(
+        "/roadmap/directions/frontend", headers={"Accept-Encoding": "identity"}
+    ).headers["etag"]
+    assert small.headers["vary"] == "Accept, Accept-Encoding"
+
+    other_encoding = client.get(
+        "/roadmap/directions/backend",
+        headers={"Accept-Encoding": "identity", "If-None-Match": compressed.headers["etag"]},
+    )
+    assert other_encoding.status_code == 200
+
+
+def test_middleware_compression_suffixes_etag(client, db_session):
+    """Test responses compressed by the middleware get a per-encoding ETag too."""
+    root_id = _big_roadmap(db_session)
+    compressed = client.get(f"/roadmap/node/{root_id}/children", headers={"Accept-Encoding": "gzip"})
+    plain = client.get(f"/roadmap/node/{root_id}/children", headers={"Accept-Encoding": "identity"})
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert compressed.headers["etag"] == plain.headers["etag"][:-1] + '-gzip"'
+    assert compressed.headers["vary"] == "Accept, Accept-Encoding"
+
+    not_modified = client.get(
+        f"/roadmap/node/{root_id}/children",
+        headers={"Accept-Encoding": "gzip", "If-None-Match": compressed.headers["etag"]},
+    )
+    assert not_modified.status_code == 304
+    assert not_modified.headers["etag"] == compressed.headers["etag"]
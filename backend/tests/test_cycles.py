@@ -0,0 +1,101 @@
+"""
+Тесты проверки циклов при записи связей и блокировок.
+"""
+import pytest
+
+from app import crud, schemas
+from app.graph import CycleError
+
+
+def _create(client, title, parent_ids=(), blocking_node_ids=()):
+    response = client.post("/admin/roadmap/nodes", json={
+        "title": title,
+        "direction": "backend",
+        "parent_ids": list(parent_ids),
+        "blocking_node_ids": list(blocking_node_ids),
+    })
+    assert response.status_code == 200
+    return response.json()["id"]
+
+
+def test_update_rejects_link_cycle(client):
+    """Test updating parents rejects links that would close a cycle."""
+    root = _create(client, "root")
+    child = _create(client, "child", [root])
+    grandchild = _create(client, "grandchild", [child])
+
+    response = client.put(f"/admin/roadmap/nodes/{root}", json={
+        "title": "root", "direction": "backend", "parent_ids": [grandchild],
+    })
+    assert response.status_code == 409
+
+    response = client.put(f"/admin/roadmap/nodes/{child}", json={
+        "title": "child", "direction": "backend", "parent_ids": [child],
+    })
+    assert response.status_code == 409
+
+    # Узел остался на месте, дерево не изменилось
+    tree = client.get("/roadmap/directions/backend").json()
+    assert [node["id"] for node in tree] == [root]
+    assert tree[0]["children"][0]["children"][0]["id"] == grandchild
+
+
+def test_block_cycles_are_rejected(client, db_session):
+    """Test blocks that would close a cycle are rejected via API and crud."""
+    first = _create(client, "first")
+    second = _create(client, "second", blocking_node_ids=[first])
+    third = _create(client, "third", blocking_node_ids=[second])
+
+    response = client.post("/admin/roadmap/blocks", json={
+        "blocking_node_id": third, "blocked_node_id": first, "block_type": "required",
+    })
+    assert response.status_code == 409
+    response = client.post("/admin/roadmap/blocks", json={
+        "blocking_node_id": first, "blocked_node_id": first, "block_type": "required",
+    })
+    assert response.status_code == 409
+
+    with pytest.raises(CycleError):
+        crud.update_node_with_blocks(db_session, first, schemas.RoadmapNodeCreate(
+            title="first", direction="backend", blocking_node_ids=[third],
+        ))
+
+    # Ребро, не замыкающее цикл, проходит
+    response = client.post("/admin/roadmap/blocks", json={
+        "blocking_node_id": first, "blocked_node_id": third, "block_type": "required",
+    })
+    assert response.status_code == 200
+
+
+def test_shared_child_is_serialized_in_full_once(client):
+    """Test a node shared by two parents is rendered in full only once."""
+    root = _create(client, "root")
+    left = _create(client, "left", [root])
+    right = _create(client, "right", [root])
+    leaf = _create(client, "leaf", [left, right])
+    _create(client, "leaf child", [leaf])
+
+    tree = client.get("/roadmap/directions/backend").json()
+    left_branch, right_branch = tree[0]["children"]
+    assert [left_branch["id"], right_branch["id"]] == [left, right]
+    # Первое вхождение общего узла - целиком, остальные - заглушкой без детей
+    assert left_branch["children"][0]["id"] == leaf
+    assert left_branch["children"][0]["children"][0]["title"] == "leaf child"
+    assert right_branch["children"][0]["id"] == leaf
+    assert right_branch["children"][0]["children"] == []
+
+
+def test_layered_dag_renders_in_linear_size(client):
+    """Test a layered DAG renders in size linear in its edges."""
+    root = _create(client, "root")
+    level = [root]
+    edges = 0
+    for depth in range(8):
+        level = [_create(client, f"{depth}-{i}", level) for i in range(2)]
+        edges += 2 * (1 if depth == 0 else 2)
+
+    def count(nodes):
+        return sum(1 + count(node["children"]) for node in nodes)
+
+    tree = client.get("/roadmap/directions/backend").json()
+    assert count(tree) <= 1 + edges
@@ -0,0 +1,63 @@
+import json
+from sqlalchemy import select
+from app.models import RoadmapNode, NodeBlock, Progress
+from app.routers import export
+
+
+def _lines(response):
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def test_export_nodes_edges_and_blocks(client, db_session, admin_headers):
+    """Test NDJSON export of the roadmap structure."""
+    root = RoadmapNode(direction="backend", title="Backend Root", resources=["https://fastapi.tiangolo.com/"])
+    child = RoadmapNode(direction="backend", title="Python", resources=[])
+    root.children.append(child)
+    db_session.add_all([root, child])
+    db_session.flush()
+    db_session.add(NodeBlock(blocking_node_id=root.id, blocked_node_id=child.id))
+    db_session.commit()
+    root_id, child_id = root.id, child.id
+
+    response = client.get("/admin/export/nodes", headers=admin_headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    nodes = _lines(response)
+    assert [node["title"] for node in nodes] == ["Backend Root", "Python"]
+    assert nodes[0]["resources"] == ["https://fastapi.tiangolo.com/"]
+
+    assert _lines(client.get("/admin/export/edges", headers=admin_headers)) == [{"source_id": root_id, "target_id": child_id}]
+
+    blocks = _lines(client.get("/admin/export/blocks", headers=admin_headers))
+    assert blocks[0]["blocking_node_id"] == root_id
+    assert blocks[0]["blocked_node_id"] == child_id
+    assert "created_at" in blocks[0]
+
+
+def test_export_progress(client, db_session, test_user, auth_headers, admin_headers):
+    """Test NDJSON export of progress rows."""
+    node = RoadmapNode(direction="backend", title="Python", resources=[])
+    db_session.add(node)
+    db_session.flush()
+    db_session.add(Progress(user_id=test_user.id, node_id=node.id, status="completed", score=10))
+    db_session.commit()
+    user_id, node_id = test_user.id, node.id
+
+    assert _lines(client.get("/admin/export/progress", headers=admin_headers)) == [
+        {"user_id": user_id, "node_id": node_id, "status": "completed", "score": 10}
+    ]
+    assert client.get("/admin/export/progress").status_code == 401
+    assert client.get("/admin/export/progress", headers=auth_headers).status_code == 403
+
+
+def test_export_stream_yields_one_chunk_per_batch(db_session, monkeypatch):
+    """Test that rows are read and emitted in batches of EXPORT_BATCH_SIZE."""
+    monkeypatch.setattr(export, "EXPORT_BATCH_SIZE", 2)
+    db_session.add_all(RoadmapNode(direction="backend", title=f"Node {i}", resources=[]) for i in range(5))
+    db_session.commit()
+
+    statement = select(RoadmapNode.id, RoadmapNode.title).order_by(RoadmapNode.id)
+    chunks = list(export._ndjson_stream(db_session, statement, lambda row: row._asdict()))
+
+    assert len(chunks) == 3
+    assert [len(chunk.splitlines()) for chunk in chunks] == [2, 2, 1]
@@ -1,7 +1,6 @@
 import pytest
 from fastapi.testclient import TestClient
-from app.models import RoadmapNode, Progress
-import json
+from app.models import NodeBlock, RoadmapNode, Progress
 
 def test_update_progress_new(client, auth_headers, test_user, db_session):
     """Test updating progress for a new node."""
@@ -10,7 +9,7 @@ def test_update_progress_new(client, auth_headers, test_user, db_session):
         direction="frontend",
         title="HTML Basics",
         description="Learn HTML",
-        resources=json.dumps([]),
+        resources=[],
         checkpoint=True
     )
     db_session.add(node)
@@ -49,7 +48,7 @@ def test_update_progress_existing(client, auth_headers, test_user, db_session):
         direction="frontend",
         title="HTML Basics",
         description="Learn HTML",
-        resources=json.dumps([]),
+        resources=[],
         checkpoint=False
     )
     db_session.add(node)
@@ -102,7 +101,7 @@ def test_update_progress_unauthorized(client, db_session):
         direction="frontend",
         title="HTML Basics",
         description="Learn HTML",
-        resources=json.dumps([]),
+        resources=[],
         checkpoint=False
     )
     db_session.add(node)
@@ -126,14 +125,14 @@ def test_get_my_progress(client, auth_headers, test_user, db_session):
         direction="frontend",
         title="HTML Basics",
         description="Learn HTML",
-        resources=json.dumps([]),
+        resources=[],
         checkpoint=False
     )
     node2 = RoadmapNode(
         direction="backend",
         title="Python Basics",
         description="Learn Python",
-        resources=json.dumps([]),
+        resources=[],
         checkpoint=True
     )
     
@@ -179,3 +178,320 @@ def test_get_my_progress_unauthorized(client):
     response = client.get("/progress/mine")
     
     assert response.status_code == 401
+
+def test_direction_availability(client, auth_headers, test_user, db_session, sql_statements):
+    """Test availability of every node in a direction computed in one blocks query."""
+    root = RoadmapNode(direction="backend", title="Root", resources=[])
+    python = RoadmapNode(direction="backend", title="Python", resources=[])
+    sql = RoadmapNode(direction="backend", title="SQL", resources=[])
+    api = RoadmapNode(direction="backend", title="API", resources=[])
+    root.children.extend([python, sql, api])
+    db_session.add_all([root, python, sql, api])
+    db_session.flush()
+    db_session.add_all([
+        NodeBlock(blocking_node_id=python.id, blocked_node_id=api.id, block_type="required"),
+        NodeBlock(blocking_node_id=sql.id, blocked_node_id=api.id, block_type="optional"),
+        Progress(user_id=test_user.id, node_id=python.id, status="completed", score=100),
+    ])
+    db_session.commit()
+    client.get("/roadmap/directions/backend")  # прогрев индекса графа
+
+    sql_statements.clear()
+    response = client.get("/roadmap/directions/backend/availability", headers=auth_headers)
+    assert response.status_code == 200
+    assert len([s for s in sql_statements if "node_blocks" in s]) == 1
+    availability = {item["node_id"]: item for item in response.json()}
+    assert list(availability) == [root.id, python.id, sql.id, api.id]
+    assert availability[python.id] == {"node_id": python.id, "available": True, "reasons": []}
+    assert availability[api.id]["available"] is False
+    assert availability[api.id]["reasons"] == [
+        {"type": "optional_block", "blocking_node": "SQL", "blocking_node_id": sql.id},
+    ]
+
+    assert client.get("/roadmap/directions/backend/availability").status_code == 401
+
+def test_frontier_is_updated_incrementally(client, auth_headers, test_user, db_session):
+    """Test the unlock frontier follows completions and block changes."""
+    basics = RoadmapNode(direction="backend", title="Basics", resources=[])
+    sql = RoadmapNode(direction="backend", title="SQL", resources=[])
+    api = RoadmapNode(direction="backend", title="API", resources=[])
+    db_session.add_all([basics, sql, api])
+    db_session.commit()
+    basics_id, sql_id, api_id = basics.id, sql.id, api.id
+    for blocking_id in (basics_id, sql_id):
+        response = client.post("/admin/roadmap/blocks", json={
+            "blocking_node_id": blocking_id, "blocked_node_id": api_id, "block_type": "required",
+        })
+        assert response.status_code == 200
+
+    def frontier():
+        response = client.get("/progress/frontier", headers=auth_headers)
+        assert response.status_code == 200
+        return set(response.json())
+
+    def complete(node_id, status="completed"):
+        response = client.post("/progress/update", headers=auth_headers, json={"node_id": node_id, "status": status})
+        assert response.status_code == 200
+
+    assert frontier() == {basics_id, sql_id}
+    complete(basics_id)
+    assert frontier() == {basics_id, sql_id}
+    complete(sql_id)
+    assert frontier() == {basics_id, sql_id, api_id}
+    complete(sql_id, "in_progress")
+    assert frontier() == {basics_id, sql_id}
+
+    # Снятие блокировки открывает узел, новая блокировка снова закрывает
+    blocks = db_session.query(NodeBlock).filter(NodeBlock.blocking_node_id == sql_id).all()
+    assert client.delete(f"/admin/roadmap/blocks/{blocks[0].id}").status_code == 200
+    assert frontier() == {basics_id, sql_id, api_id}
+    response = client.post("/admin/roadmap/blocks", json={
+        "blocking_node_id": sql_id, "blocked_node_id": api_id, "block_type": "required",
+    })
+    assert response.status_code == 200
+    assert frontier() == {basics_id, sql_id}
+
+def test_concurrent_blocker_completions_unlock_node(threaded_client, test_user, db_session, monkeypatch):
+    """Test two sessions completing different required blockers at once both count toward the unlock."""
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+    from app import frontier
+    from app.auth import create_jwt
+
+    basics = RoadmapNode(direction="backend", title="Basics", resources=[])
+    sql = RoadmapNode(direction="backend", title="SQL", resources=[])
+    api = RoadmapNode(direction="backend", title="API", resources=[])
+    db_session.add_all([basics, sql, api])
+    db_session.flush()
+    db_session.add_all([
+        NodeBlock(blocking_node_id=basics.id, blocked_node_id=api.id, block_type="required"),
+        NodeBlock(blocking_node_id=sql.id, blocked_node_id=api.id, block_type="required"),
+    ])
+    db_session.commit()
+    basics_id, sql_id, api_id = basics.id, sql.id, api.id
+    headers = {"Authorization": f"Bearer {create_jwt(str(test_user.id))}"}
+
+    # Обе транзакции записывают свой прогресс до пересчёта. В SQLite писатели и так
+    # идут по очереди, поэтому ожидание обрывается по таймауту
+    barrier = threading.Barrier(2)
+    refresh_unlocked = frontier.refresh_unlocked
+
+    def refresh_after_both_flushed(*args, **kwargs):
+        try:
+            barrier.wait(timeout=1)
+        except threading.BrokenBarrierError:
+            pass
+        refresh_unlocked(*args, **kwargs)
+
+    monkeypatch.setattr("app.routers.progress.refresh_unlocked", refresh_after_both_flushed)
+
+    def complete(node_id):
+        return threaded_client.post(
+            "/progress/update", headers=headers, json={"node_id": node_id, "status": "completed"}
+        ).status_code
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        assert list(pool.map(complete, [basics_id, sql_id])) == [200, 200]
+
+    frontier_ids = threaded_client.get("/progress/frontier", headers=headers).json()
+    assert api_id in frontier_ids
+
+def test_users_availability_from_bitsets(client, auth_headers, admin_headers, test_user, db_session, sql_statements):
+    """Test bulk availability for many users is answered from in-memory bitsets."""
+    from app.models import User
+
+    basics = RoadmapNode(direction="backend", title="Basics", resources=[])
+    sql = RoadmapNode(direction="backend", title="SQL", resources=[])
+    api = RoadmapNode(direction="backend", title="API", resources=[])
+    other = RoadmapNode(direction="frontend", title="HTML", resources=[])
+    basics.children.append(api)
+    sql.children.append(api)
+    other_user = User(email="other@example.com", password_hash="x", role="junior", xp=0, badges=[])
+    db_session.add_all([basics, sql, api, other, other_user])
+    db_session.flush()
+    db_session.add_all([
+        NodeBlock(blocking_node_id=basics.id, blocked_node_id=api.id, block_type="required"),
+        NodeBlock(blocking_node_id=sql.id, blocked_node_id=api.id, block_type="optional"),
+        Progress(user_id=other_user.id, node_id=basics.id, status="completed", score=100),
+    ])
+    db_session.commit()
+    url = f"/admin/roadmap/availability?user_ids={test_user.id}&user_ids={other_user.id}&direction=backend"
+
+    assert client.get(url, headers=admin_headers).json() == [
+        {"user_id": test_user.id, "available_node_ids": sorted([basics.id, sql.id])},
+        {"user_id": other_user.id, "available_node_ids": sorted([basics.id, sql.id, api.id])},
+    ]
+
+    # Завершение узла обновляет биты без перестроения снимка
+    response = client.post("/progress/update", headers=auth_headers, json={"node_id": basics.id, "status": "completed"})
+    assert response.status_code == 200
+    sql_statements.clear()
+    response = client.get(url, headers=admin_headers)
+    # Кроме загрузки пользователя для проверки прав
+    assert [s for s in sql_statements if "FROM users" not in s] == []
+    assert response.json()[0]["available_node_ids"] == sorted([basics.id, sql.id, api.id])
+
+    everything = client.get(f"/admin/roadmap/availability?user_ids={test_user.id}", headers=admin_headers).json()
+    assert everything[0]["available_node_ids"] == sorted([basics.id, sql.id, api.id, other.id])
+    assert client.get("/admin/roadmap/availability", headers=admin_headers).status_code == 422
+    assert client.get(url).status_code == 401
+    assert client.get(url, headers=auth_headers).status_code == 403
+
+def test_node_plan(client, auth_headers, test_user, db_session, sql_statements):
+    """Test the plan lists remaining parents and required blockers in topological order."""
+    root = RoadmapNode(direction="backend", title="Root", resources=[])
+    python = RoadmapNode(direction="backend", title="Python", resources=[])
+    sql = RoadmapNode(direction="backend", title="SQL", resources=[], checkpoint=True)
+    docker = RoadmapNode(direction="devops", title="Docker", resources=[])
+    senior = RoadmapNode(direction="backend", title="Senior", resources=[], checkpoint=True)
+    optional = RoadmapNode(direction="backend", title="Optional", resources=[])
+    root.children.extend([python, sql])
+    python.children.append(senior)
+    db_session.add_all([root, python, sql, docker, senior, optional])
+    db_session.flush()
+    db_session.add_all([
+        NodeBlock(blocking_node_id=sql.id, blocked_node_id=senior.id, block_type="required"),
+        NodeBlock(blocking_node_id=docker.id, blocked_node_id=sql.id, block_type="required"),
+        NodeBlock(blocking_node_id=optional.id, blocked_node_id=senior.id, block_type="optional"),
+        Progress(user_id=test_user.id, node_id=root.id, status="completed", score=100),
+    ])
+    db_session.commit()
+    client.get("/roadmap/directions/backend")  # прогрев индекса графа
+
+    sql_statements.clear()
+    response = client.get(f"/roadmap/node/{senior.id}/plan", headers=auth_headers)
+    assert response.status_code == 200
+    assert len([s for s in sql_statements if "progress" in s]) == 1
+    plan = response.json()
+    assert [step["title"] for step in plan["steps"]] == ["Python", "Docker", "SQL", "Senior"]
+    assert [step["xp"] for step in plan["steps"]] == [20, 20, 50, 50]
+    assert plan["total_xp"] == 140
+    assert plan["projected_xp"] == 240
+    assert [step["new_badges"] for step in plan["steps"]] == [[], [], [], []]
+
+    # Завершённые узлы и всё, что за ними, в план не попадают
+    client.post("/progress/update", headers=auth_headers, json={"node_id": sql.id, "status": "completed"})
+    plan = client.get(f"/roadmap/node/{senior.id}/plan", headers=auth_headers).json()
+    assert [step["title"] for step in plan["steps"]] == ["Python", "Senior"]
+    assert client.get(f"/roadmap/node/{root.id}/plan", headers=auth_headers).json()["steps"] == []
+    assert client.get("/roadmap/node/999/plan", headers=auth_headers).status_code == 404
+
+def test_update_progress_batch(client, auth_headers, test_user, db_session, sql_statements):
+    """Test a batch of updates loads nodes and progress once and commits once."""
+    from app.models import User
+
+    nodes = [RoadmapNode(direction="backend", title=f"Node {i}", resources=[], checkpoint=i == 0) for i in range(4)]
+    db_session.add_all(nodes)
+    db_session.flush()
+    db_session.add(Progress(user_id=test_user.id, node_id=nodes[1].id, status="in_progress", score=0))
+    db_session.commit()
+    ids = [node.id for node in nodes]
+    client.get("/roadmap/directions/backend")  # прогрев индекса графа
+
+    sql_statements.clear()
+    response = client.post("/progress/batch", headers=auth_headers, json=[
+        {"node_id": ids[0], "status": "completed", "score": 100},
+        {"node_id": ids[1], "status": "completed", "score": 50},
+        {"node_id": ids[2], "status": "in_progress"},
+        {"node_id": ids[1], "status": "completed", "score": 90},
+    ])
+    assert response.status_code == 200
+    assert [(item["node_id"], item["status"], item["score"]) for item in response.json()] == [
+        (ids[0], "completed", 100), (ids[1], "completed", 90), (ids[2], "in_progress", 0),
+    ]
+    selects = [s for s in sql_statements if s.lstrip().upper().startswith("SELECT")]
+    assert len([s for s in selects if "FROM roadmap_nodes" in s]) == 1
+    assert len([s for s in selects if "FROM progress" in s]) == 1
+    assert len([s for s in sql_statements if s.lstrip().upper().startswith("UPDATE USERS")]) == 1
+
+    db_session.expire_all()
+    user = db_session.get(User, test_user.id)
+    assert user.xp == 100 + (20 + 30 + 10) + (20 + 5)
+    statuses = dict(db_session.query(Progress.node_id, Progress.status).filter(Progress.user_id == test_user.id).all())
+    assert statuses == {ids[0]: "completed", ids[1]: "completed", ids[2]: "in_progress"}
+
+    # Неизвестный узел отклоняет весь пакет
+    response = client.post("/progress/batch", headers=auth_headers, json=[
+        {"node_id": ids[3], "status": "completed"},
+        {"node_id": 999, "status": "completed"},
+    ])
+    assert response.status_code == 404
+    assert "999" in response.json()["detail"]
+    db_session.expire_all()
+    assert db_session.query(Progress).filter(Progress.node_id == ids[3]).count() == 0
+    assert client.post("/progress/batch", headers=auth_headers, json=[]).json() == []
+
+def test_concurrent_xp_awards_are_not_lost(threaded_client, db_session, test_user):
+    """Test concurrent completions award XP once per node and none of it is lost."""
+    from concurrent.futures import ThreadPoolExecutor
+    from app.auth import create_jwt
+    from app.models import User
+
+    nodes = [RoadmapNode(direction="backend", title=f"Node {i}", resources=[], checkpoint=True) for i in range(10)]
+    db_session.add_all(nodes)
+    db_session.commit()
+    node_ids = [node.id for node in nodes]
+    headers = {"Authorization": f"Bearer {create_jwt(str(test_user.id))}"}
+
+    # Каждый узел завершается четырьмя запросами сразу, строки progress ещё нет
+    def complete(node_id):
+        return threaded_client.post(
+            "/progress/update", headers=headers, json={"node_id": node_id, "status": "completed", "score": 100}
+        ).status_code
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        statuses = list(pool.map(complete, node_ids * 4))
+
+    assert statuses == [200] * 40
+    db_session.expire_all()
+    user = db_session.get(User, test_user.id)
+    assert user.xp == 100 + 10 * 60
+    assert user.badges == ["Apprentice", "Journeyman", "Adept"]
+    assert db_session.query(Progress).filter(Progress.user_id == test_user.id).count() == 10
+
+def test_badges_are_stored_per_row(client, auth_headers, test_user, db_session):
+    """Test earned badges go to user_badges and are counted there."""
+    from app.models import User, UserBadge
+    from app.xp import badges_for
+
+    assert badges_for(99) == []
+    assert badges_for(600) == ["Apprentice", "Journeyman", "Adept"]
+
+    other = User(email="other@example.com", password_hash="x", role="junior", xp=650,
+                 badges=["Apprentice", "Journeyman", "Adept"])
+    node = RoadmapNode(direction="backend", title="Capstone", resources=[], checkpoint=True)
+    db_session.add_all([other, node])
+    test_user.xp = 280
+    db_session.commit()
+
+    response = client.post("/progress/update", headers=auth_headers, json={"node_id": node.id, "status": "completed"})
+    assert response.status_code == 200
+    me = client.get("/auth/me", headers=auth_headers).json()
+    assert me["xp"] == 330
+    assert me["badges"] == ["Apprentice", "Journeyman"]
+    assert db_session.query(UserBadge).filter(UserBadge.user_id == test_user.id).count() == 2
+
+    counts = client.get("/progress/badges", headers=auth_headers).json()
+    assert counts == [
+        {"badge": "Apprentice", "count": 2},
+        {"badge": "Journeyman", "count": 2},
+        {"badge": "Adept", "count": 1},
+    ]
+    holders = client.get("/progress/badges/Journeyman", headers=auth_headers).json()
+    assert [(holder["user_id"], holder["xp"]) for holder in holders] == [(other.id, 650), (test_user.id, 330)]
+    assert client.get("/progress/badges/Master", headers=auth_headers).json() == []
+    assert client.get("/progress/badges").status_code == 401
+
+def test_missing_badges_are_awarded_on_next_completion(client, auth_headers, test_user, db_session):
+    """Test a user whose XP is already past thresholds gets the badges they lack."""
+    node = RoadmapNode(direction="backend", title="Node", resources=[])
+    db_session.add(node)
+    test_user.xp = 700
+    test_user.badges = []
+    db_session.commit()
+
+    response = client.post("/progress/update", headers=auth_headers, json={"node_id": node.id, "status": "completed"})
+    assert response.status_code == 200
+    me = client.get("/auth/me", headers=auth_headers).json()
+    assert me["xp"] == 720
+    assert me["badges"] == ["Apprentice", "Journeyman", "Adept"]
@@ -0,0 +1,102 @@
+"""
+Проверка, что чтение узлов выполняет фиксированное число SQL-запросов.
+"""
+import pytest
+from app.cache import rendered_cache
+from app.graph import graph_index
+from app.models import RoadmapNode, NodeBlock
+
+
+def _seed_tree(db_session, direction, size):
+    """Create a root with `size` children, each blocked by the previous one."""
+    root = RoadmapNode(direction=direction, title=f"{direction} root", resources=[])
+    db_session.add(root)
+    previous = None
+    for i in range(size):
+        child = RoadmapNode(direction=direction, title=f"{direction} {i}", resources=[])
+        root.children.append(child)
+        db_session.add(child)
+        db_session.flush()
+        if previous is not None:
+            db_session.add(NodeBlock(blocking_node_id=previous.id, blocked_node_id=child.id))
+        previous = child
+    db_session.commit()
+    return root
+
+
+def _count(client, sql_statements, method, url, **kwargs):
+    # Первый запрос прогревает индекс графа, готовые ответы не учитываем
+    rendered_cache.invalidate()
+    getattr(client, method)(url, **kwargs)
+    rendered_cache.invalidate()
+    sql_statements.clear()
+    response = getattr(client, method)(url, **kwargs)
+    assert response.status_code == 200
+    return len(sql_statements)
+
+
+@pytest.mark.parametrize("method,url", [
+    ("get", "/roadmap/"),
+    ("get", "/roadmap/directions/backend"),
+    ("get", "/admin/roadmap/nodes"),
+])
+def test_node_reads_use_constant_number_of_queries(client, db_session, sql_statements, method, url):
+    _seed_tree(db_session, "backend", 3)
+    small = _count(client, sql_statements, method, url)
+
+    _seed_tree(db_session, "backend", 30)
+    db_session.expire_all()
+    graph_index.invalidate()
+    large = _count(client, sql_statements, method, url)
+
+    # Узлы и блокировки, связи берутся из индекса графа
+    assert small == 2
+    assert large == small
+
+
+def test_nodes_by_ids_use_constant_number_of_queries(client, db_session, sql_statements):
+    root = _seed_tree(db_session, "backend", 20)
+    ids = [root.id] + [child.id for child in root.children]
+
+    count = _count(client, sql_statements, "post", "/admin/roadmap/nodes/by-ids", json={"node_ids": ids})
+
+    assert count == 2
+
+
+def test_node_read_uses_constant_number_of_queries(client, db_session, sql_statements):
+    root = _seed_tree(db_session, "backend", 20)
+
+    count = _count(client, sql_statements, "get", f"/roadmap/node/{root.id}")
+
+    assert count == 2
+
+
+def test_node_dependencies_use_constant_number_of_queries(client, db_session, sql_statements):
+    target = RoadmapNode(direction="backend", title="Target", resources=[])
+    blockers = [RoadmapNode(direction="backend", title=f"Blocker {i}", resources=[]) for i in range(10)]
+    db_session.add_all([target] + blockers)
+    db_session.flush()
+    db_session.add_all([NodeBlock(blocking_node_id=node.id, blocked_node_id=target.id) for node in blockers])
+    db_session.commit()
+
+    count = _count(client, sql_statements, "get", f"/admin/roadmap/nodes/{target.id}/dependencies")
+
+    assert count == 3
+    titles = [node["title"] for node in client.get(f"/admin/roadmap/nodes/{target.id}/dependencies").json()]
+    assert titles == [f"Blocker {i}" for i in range(10)]
+
+
+def test_transitive_dependencies(client, db_session, sql_statements):
+    root = _seed_tree(db_session, "backend", 5)
+    chain = [child.id for child in root.children]
+    url = f"/admin/roadmap/nodes/{chain[-1]}/dependencies?transitive=true"
+
+    count = _count(client, sql_statements, "get", url)
+
+    assert count == 1
+    response = client.get(url)
+    assert [(node["id"], node["depth"]) for node in response.json()] == [
+        (chain[3], 1), (chain[2], 2), (chain[1], 3), (chain[0], 4),
+    ]
+    assert "children" not in response.json()[0]
+    assert client.get(f"/admin/roadmap/nodes/{chain[0]}/dependencies?transitive=true").json() == []
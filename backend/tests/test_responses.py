@@ -0,0 +1,78 @@
+"""
+Тесты класса JSON-ответа по умолчанию.
+"""
+from datetime import datetime
+
+import msgpack
+import pytest
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app.main import app
+from app.models import RoadmapNode
+from app.responses import FastJSONResponse, get_response_class
+
+
+def test_app_uses_fast_json_response():
+    assert app.router.default_response_class is FastJSONResponse
+    assert get_response_class("json") is JSONResponse
+    with pytest.raises(ValueError):
+        get_response_class("yaml")
+
+
+def test_fast_json_response_matches_standard_encoder():
+    content = {"title": "Узел", "created_at": datetime(2026, 1, 2, 3, 4, 5), "ids": [1, 2]}
+    assert FastJSONResponse(content).body == JSONResponse(jsonable_encoder(content)).body
+
+
+def test_block_created_at_is_serialized(client, db_session):
+    first = RoadmapNode(direction="backend", title="First", resources=[])
+    second = RoadmapNode(direction="backend", title="Second", resources=[])
+    db_session.add_all([first, second])
+    db_session.commit()
+    response = client.post("/admin/roadmap/blocks", json={
+        "blocking_node_id": first.id, "blocked_node_id": second.id, "block_type": "required",
+    })
+    assert response.status_code == 200
+    assert datetime.fromisoformat(response.json()["created_at"])
+
+
+def test_msgpack_is_negotiated_by_accept(client, db_session):
+    root = RoadmapNode(direction="backend", title="Root", resources=["https://python.org"])
+    child = RoadmapNode(direction="backend", title="Child", resources=[])
+    root.children.append(child)
+    db_session.add_all([root, child])
+    db_session.commit()
+
+    for url in ["/roadmap/directions/backend", f"/roadmap/node/{root.id}", "/admin/roadmap/nodes"]:
+        as_json = client.get(url)
+        as_msgpack = client.get(url, headers={"Accept": "application/msgpack"})
+        assert as_msgpack.status_code == 200
+        assert as_msgpack.headers["content-type"] == "application/msgpack"
+        assert "Accept" in as_msgpack.headers["vary"]
+        assert msgpack.unpackb(as_msgpack.content) == as_json.json()
+        assert len(as_msgpack.content) < len(as_json.content)
+        assert as_msgpack.headers["etag"] != as_json.headers["etag"]
+
+
+def test_msgpack_progress_endpoints(client, auth_headers, test_user, db_session):
+    """Test progress endpoints negotiate MessagePack like the roadmap ones."""
+    node = RoadmapNode(direction="backend", title="Python", resources=[])
+    db_session.add(node)
+    db_session.commit()
+    headers = {**auth_headers, "Accept": "application/msgpack"}
+
+    response = client.post("/progress/update", headers=headers, json={"node_id": node.id, "status": "in_progress"})
+    assert response.headers["content-type"] == "application/msgpack"
+    assert msgpack.unpackb(response.content)["status"] == "in_progress"
+
+    response = client.post("/progress/batch", headers=headers, json=[{"node_id": node.id, "status": "completed"}])
+    assert response.headers["content-type"] == "application/msgpack"
+    assert [item["status"] for item in msgpack.unpackb(response.content)] == ["completed"]
+
+    for url in ["/progress/mine", "/progress/frontier", "/progress/badges"]:
+        as_json = client.get(url, headers=auth_headers)
+        as_msgpack = client.get(url, headers=headers)
+        assert as_msgpack.status_code == 200
+        assert as_msgpack.headers["content-type"] == "application/msgpack"
+        assert msgpack.unpackb(as_msgpack.content) == as_json.json()
@@ -1,7 +1,7 @@
 import pytest
 from fastapi.testclient import TestClient
+from app.graph import graph_index
 from app.models import RoadmapNode
-import json
 
 def test_get_all_roadmap_nodes(client, db_session):
     """Test getting all roadmap nodes."""
@@ -10,14 +10,14 @@ def test_get_all_roadmap_nodes(client, db_session):
         direction="frontend",
         title="HTML Basics",
         description="Learn HTML fundamentals",
-        resources=json.dumps(["https://example.com"]),
+        resources=["https://example.com"],
         checkpoint=True
     )
     node2 = RoadmapNode(
         direction="backend",
         title="Python Basics",
         description="Learn Python fundamentals",
-        resources=json.dumps(["https://python.org"]),
+        resources=["https://python.org"],
         checkpoint=False
     )
     
@@ -47,14 +47,14 @@ def test_get_roadmap_directions(client, db_session):
         direction="frontend",
         title="HTML Basics",
         description="Learn HTML",
-        resources=json.dumps([]),
+        resources=[],
         checkpoint=False
     )
     node2 = RoadmapNode(
         direction="backend",
         title="Python Basics",
         description="Learn Python",
-        resources=json.dumps([]),
+        resources=[],
         checkpoint=False
     )
     
@@ -76,14 +76,14 @@ def test_get_nodes_by_direction(client, db_session):
         direction="frontend",
         title="HTML Basics",
         description="Learn HTML",
-        resources=json.dumps([]),
+        resources=[],
         checkpoint=False
     )
     backend_node = RoadmapNode(
         direction="backend",
         title="Python Basics",
         description="Learn Python",
-        resources=json.dumps([]),
+        resources=[],
         checkpoint=False
     )
     
@@ -105,7 +105,7 @@ def test_get_specific_node(client, db_session):
         direction="frontend",
         title="HTML Basics",
         description="Learn HTML fundamentals",
-        resources=json.dumps(["https://example.com"]),
+        resources=["https://example.com"],
         checkpoint=True
     )
     
@@ -129,3 +129,368 @@ def test_get_nonexistent_node(client):
     
     assert response.status_code == 404
     assert "not found" in response.json()["detail"]
+
+def test_get_nodes_by_direction_returns_only_roots(client, db_session):
+    """Test that direction endpoint returns root nodes with nested children."""
+    root = RoadmapNode(direction="backend", title="Backend Root", resources=[])
+    child = RoadmapNode(direction="backend", title="Python", resources=[])
+    grandchild = RoadmapNode(direction="backend", title="FastAPI", resources=[])
+    root.children.append(child)
+    child.children.append(grandchild)
+    db_session.add_all([root, child, grandchild])
+    db_session.commit()
+
+    response = client.get("/roadmap/directions/backend")
+
+    assert response.status_code == 200
+    data = response.json()
+    assert [node["title"] for node in data] == ["Backend Root"]
+    assert data[0]["children"][0]["title"] == "Python"
+    assert data[0]["children"][0]["children"][0]["title"] == "FastAPI"
+
+def test_cross_direction_child_is_root_of_its_direction(client, db_session):
+    """Test a node whose parents are all in another direction is a root of its own."""
+    backend = RoadmapNode(direction="backend", title="Backend Root", resources=[])
+    docker = RoadmapNode(direction="devops", title="Docker", resources=[])
+    compose = RoadmapNode(direction="devops", title="Compose", resources=[])
+    backend.children.append(docker)
+    docker.children.append(compose)
+    db_session.add_all([backend, docker, compose])
+    db_session.commit()
+
+    devops = client.get("/roadmap/directions/devops").json()
+    assert [node["title"] for node in devops] == ["Docker"]
+    assert devops[0]["children"][0]["title"] == "Compose"
+    backend_tree = client.get("/roadmap/directions/backend").json()
+    assert [node["title"] for node in backend_tree] == ["Backend Root"]
+    assert backend_tree[0]["children"][0]["title"] == "Docker"
+    layout = client.get("/roadmap/directions/devops/layout").json()
+    assert [node["id"] for node in layout["nodes"]] == [docker.id, compose.id]
+
+def test_graph_index_refreshed_after_admin_write(client, db_session):
+    """Test that roots reflect nodes created through the admin API."""
+    root = RoadmapNode(direction="devops", title="DevOps Root", resources=[])
+    db_session.add(root)
+    db_session.commit()
+
+    assert len(client.get("/roadmap/directions/devops").json()) == 1
+
+    response = client.post("/admin/roadmap/nodes", json={
+        "title": "Docker",
+        "direction": "devops",
+        "parent_ids": [root.id],
+    })
+    assert response.status_code == 200
+    response = client.post("/admin/roadmap/nodes", json={
+        "title": "Kubernetes",
+        "direction": "devops",
+    })
+    assert response.status_code == 200
+
+    data = client.get("/roadmap/directions/devops").json()
+    assert [node["title"] for node in data] == ["DevOps Root", "Kubernetes"]
+    assert data[0]["children"][0]["title"] == "Docker"
+
+def test_get_roadmap_graph_format_deduplicates_shared_nodes(client, db_session):
+    """Test that ?format=graph returns each node once with separate edges."""
+    root = RoadmapNode(direction="backend", title="Backend Root", resources=[])
+    python = RoadmapNode(direction="backend", title="Python", resources=["https://python.org"])
+    sql = RoadmapNode(direction="backend", title="SQL", resources=[])
+    fastapi = RoadmapNode(direction="backend", title="FastAPI", resources=[])
+    other = RoadmapNode(direction="frontend", title="HTML", resources=[])
+    root.children.extend([python, sql])
+    python.children.append(fastapi)
+    sql.children.append(fastapi)
+    db_session.add_all([root, python, sql, fastapi, other])
+    db_session.commit()
+
+    response = client.get("/roadmap/directions/backend?format=graph")
+
+    assert response.status_code == 200
+    data = response.json()
+    assert sorted(node["title"] for node in data["nodes"]) == ["Backend Root", "FastAPI", "Python", "SQL"]
+    assert "children" not in data["nodes"][0]
+    assert len(data["edges"]) == 4
+    assert {"source_id": sql.id, "target_id": fastapi.id} in data["edges"]
+    assert data["blocks"] == []
+    python_out = next(node for node in data["nodes"] if node["id"] == python.id)
+    assert python_out["resources"] == ["https://python.org"]
+
+    full = client.get("/roadmap/?format=graph").json()
+    assert len(full["nodes"]) == 5
+
+    admin = client.get("/admin/roadmap/nodes?format=graph").json()
+    assert len(admin["nodes"]) == 5
+    assert len(admin["edges"]) == 4
+
+def test_roadmap_etag_not_modified(client, db_session, sql_statements):
+    """Test that a matching If-None-Match returns 304 without querying the database."""
+    node = RoadmapNode(direction="frontend", title="HTML Basics", resources=[])
+    db_session.add(node)
+    db_session.commit()
+
+    response = client.get("/roadmap/directions/frontend")
+    etag = response.headers["etag"]
+    assert response.status_code == 200
+
+    sql_statements.clear()
+    response = client.get("/roadmap/directions/frontend", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+    assert sql_statements == []
+
+    client.post("/admin/roadmap/nodes", json={"title": "CSS", "direction": "frontend"})
+
+    response = client.get("/roadmap/directions/frontend", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert len(response.json()) == 2
+
+def test_rendered_roadmap_cache_invalidated_per_direction(client, db_session, sql_statements):
+    """Test that cached payloads are served without queries and dropped only for touched directions."""
+    frontend = RoadmapNode(direction="frontend", title="HTML Basics", resources=[])
+    backend = RoadmapNode(direction="backend", title="Python Basics", resources=[])
+    db_session.add_all([frontend, backend])
+    db_session.commit()
+
+    first = client.get("/roadmap/directions/frontend")
+    client.get("/roadmap/directions/backend")
+    sql_statements.clear()
+    second = client.get("/roadmap/directions/frontend")
+    assert second.content == first.content
+    assert second.headers["content-type"] == "application/json"
+    assert sql_statements == []
+
+    response = client.post("/admin/roadmap/nodes", json={
+        "title": "Django",
+        "direction": "backend",
+        "parent_ids": [backend.id],
+    })
+    assert response.status_code == 200
+
+    stats = client.get("/admin/roadmap/cache").json()
+    assert stats["entries"] == 1
+    assert stats["hits"] >= 1
+
+    sql_statements.clear()
+    assert client.get("/roadmap/directions/frontend").content == first.content
+    assert sql_statements == []
+    backend_tree = client.get("/roadmap/directions/backend").json()
+    assert backend_tree[0]["children"][0]["title"] == "Django"
+
+def test_roadmap_keyset_pagination(client, db_session):
+    """Test paging through all nodes with a cursor."""
+    for direction in ("frontend", "backend"):
+        for i in range(3):
+            db_session.add(RoadmapNode(direction=direction, title=f"{direction} {i}", order_index=2 - i, resources=[]))
+    db_session.commit()
+
+    titles = []
+    cursor = None
+    pages = 0
+    while True:
+        params = {"limit": 4}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get("/roadmap/", params=params)
+        assert response.status_code == 200
+        titles.extend(node["title"] for node in response.json())
+        pages += 1
+        cursor = response.headers.get("x-next-cursor")
+        if not cursor:
+            break
+
+    assert pages == 2
+    assert titles == [
+        "backend 2", "backend 1", "backend 0",
+        "frontend 2", "frontend 1", "frontend 0",
+    ]
+
+    admin_page = client.get("/admin/roadmap/nodes", params={"limit": 2, "format": "graph"})
+    assert [node["title"] for node in admin_page.json()["nodes"]] == ["backend 2", "backend 1"]
+    assert "x-next-cursor" in admin_page.headers
+
+    assert client.get("/roadmap/", params={"cursor": "not-a-cursor"}).status_code == 400
+
+def test_roadmap_sparse_fields_and_depth(client, db_session, sql_statements):
+    """Test that ?fields= and ?depth= trim node payloads and selected columns."""
+    root = RoadmapNode(direction="backend", title="Backend Root", description="Long text", resources=["https://fastapi.tiangolo.com/"])
+    child = RoadmapNode(direction="backend", title="Python", resources=[])
+    grandchild = RoadmapNode(direction="backend", title="FastAPI", resources=[])
+    root.children.append(child)
+    child.children.append(grandchild)
+    db_session.add_all([root, child, grandchild])
+    db_session.commit()
+    # Индекс графа (он читает и блокировки) строится один раз на процесс
+    graph_index.get(db_session)
+
+    sql_statements.clear()
+    response = client.get("/roadmap/directions/backend", params={"fields": "title,checkpoint", "depth": 1})
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data == [{
+        "id": root.id,
+        "title": "Backend Root",
+        "checkpoint": False,
+        "children": [{"id": child.id, "title": "Python", "checkpoint": False}],
+    }]
+    assert not any("description" in statement for statement in sql_statements)
+    assert not any("node_blocks" in statement for statement in sql_statements)
+
+    node = client.get(f"/roadmap/node/{root.id}", params={"fields": "resources", "depth": 0}).json()
+    assert node == {"id": root.id, "resources": ["https://fastapi.tiangolo.com/"]}
+
+    listing = client.get("/roadmap/", params={"fields": "title", "depth": 0}).json()
+    assert sorted(item["title"] for item in listing) == ["Backend Root", "FastAPI", "Python"]
+
+    page = client.get("/admin/roadmap/nodes", params={"fields": "title", "depth": 0, "limit": 2}).json()
+    assert page == [{"id": root.id, "title": "Backend Root"}, {"id": child.id, "title": "Python"}]
+
+    assert client.get("/roadmap/", params={"fields": "password"}).status_code == 400
+    assert client.get("/roadmap/", params={"depth": 1, "format": "graph"}).status_code == 400
+
+def test_roadmap_sparse_fields_without_columns(client, db_session):
+    """Test ?fields= that selects no node column still returns ids."""
+    root = RoadmapNode(direction="backend", title="Backend Root", resources=[])
+    child = RoadmapNode(direction="backend", title="Python", resources=[])
+    root.children.append(child)
+    db_session.add_all([root, child])
+    db_session.commit()
+
+    for fields in ("", "id", "blocked_by"):
+        response = client.get("/roadmap/", params={"fields": fields, "depth": 0})
+        assert response.status_code == 200, fields
+        assert sorted(item["id"] for item in response.json()) == sorted([root.id, child.id])
+    data = client.get("/roadmap/directions/backend", params={"fields": "blocked_by"}).json()
+    assert data == [{"id": root.id, "blocked_by": [], "children": [{"id": child.id, "blocked_by": [], "children": []}]}]
+
+def test_roadmap_sparse_shared_child_rendered_once(client, db_session):
+    """Test a child shared by two parents is rendered in full only once per tree."""
+    root = RoadmapNode(direction="backend", title="Root", resources=[])
+    left = RoadmapNode(direction="backend", title="Left", resources=[])
+    right = RoadmapNode(direction="backend", title="Right", resources=[])
+    leaf = RoadmapNode(direction="backend", title="Leaf", resources=[])
+    root.children.extend([left, right])
+    left.children.append(leaf)
+    right.children.append(leaf)
+    db_session.add_all([root, left, right, leaf])
+    db_session.commit()
+
+    data = client.get("/roadmap/directions/backend", params={"fields": "title", "depth": 2}).json()
+    left_branch, right_branch = data[0]["children"]
+    assert left_branch["children"] == [{"id": leaf.id, "title": "Leaf"}]
+    assert right_branch["children"] == [{"id": leaf.id}]
+
+def test_get_node_children_paged(client, db_session):
+    """Test lazy loading of a node's children."""
+    root = RoadmapNode(direction="backend", title="Backend Root", resources=[])
+    children = [
+        RoadmapNode(direction="backend", title=f"Child {i}", order_index=i, resources=[])
+        for i in range(3)
+    ]
+    leaf = RoadmapNode(direction="backend", title="Leaf", resources=[])
+    root.children.extend(children)
+    children[0].children.append(leaf)
+    db_session.add_all([root, *children, leaf])
+    db_session.commit()
+
+    response = client.get(f"/roadmap/node/{root.id}/children", params={"limit": 2})
+
+    assert response.status_code == 200
+    assert response.headers["x-total-count"] == "3"
+    data = response.json()
+    assert [child["title"] for child in data] == ["Child 0", "Child 1"]
+    assert [child["has_children"] for child in data] == [True, False]
+    assert data[0]["children"] == []
+
+    second_page = client.get(f"/roadmap/node/{root.id}/children", params={"limit": 2, "offset": 2}).json()
+    assert [child["title"] for child in second_page] == ["Child 2"]
+
+    nested = client.get(f"/roadmap/node/{root.id}/children", params={"depth": 2}).json()
+    assert nested[0]["children"][0]["title"] == "Leaf"
+    assert nested[0]["children"][0]["has_children"] is False
+
+    assert client.get("/roadmap/node/999/children").status_code == 404
+
+
+def test_direction_layout(client, db_session, sql_statements):
+    """Test topological order, longest-path levels and in-level positions of a direction."""
+    root = RoadmapNode(direction="backend", title="Root", resources=[])
+    late = RoadmapNode(direction="backend", title="Late", order_index=2, resources=[])
+    early = RoadmapNode(direction="backend", title="Early", order_index=1, resources=[])
+    join = RoadmapNode(direction="backend", title="Join", resources=[])
+    other = RoadmapNode(direction="frontend", title="Other", resources=[])
+    root.children.extend([late, early])
+    early.children.append(join)
+    late.children.append(join)
+    # Короткий путь root -> join не должен поднимать join выше
+    root.children.append(join)
+    db_session.add_all([root, late, early, join, other])
+    db_session.commit()
+
+    response = client.get("/roadmap/directions/backend/layout")
+    assert response.status_code == 200
+    layout = response.json()
+    assert layout["direction"] == "backend"
+    assert layout["level_count"] == 3
+    assert [(node["id"], node["level"], node["position"]) for node in layout["nodes"]] == [
+        (root.id, 0, 0), (early.id, 1, 0), (late.id, 1, 1), (join.id, 2, 0),
+    ]
+
+    sql_statements.clear()
+    assert client.get("/roadmap/directions/backend/layout").json() == layout
+    assert sql_statements == []
+
+    # Запись в другое направление не сбрасывает раскладку
+    response = client.post("/admin/roadmap/nodes", json={"title": "Vue", "direction": "frontend", "parent_ids": [other.id]})
+    assert response.status_code == 200
+    sql_statements.clear()
+    assert client.get("/roadmap/directions/backend/layout").json() == layout
+    assert sql_statements == []
+
+    assert client.get("/roadmap/directions/unknown/layout").json() == {
+        "direction": "unknown", "level_count": 0, "nodes": [],
+    }
+
+
+def test_resources_are_stored_as_native_json(client, db_session):
+    """Test that resources are stored as a JSON list and can be queried in SQL."""
+    response = client.post("/admin/roadmap/nodes", json={
+        "title": "FastAPI",
+        "direction": "backend",
+        "resources": ["https://fastapi.tiangolo.com/", "https://docs.pydantic.dev/"],
+    })
+    assert response.status_code == 200
+    node_id = response.json()["id"]
+
+    node = db_session.get(RoadmapNode, node_id)
+    assert node.resources == ["https://fastapi.tiangolo.com/", "https://docs.pydantic.dev/"]
+    matched = db_session.query(RoadmapNode.id).filter(
+        RoadmapNode.resources[0].as_string() == "https://fastapi.tiangolo.com/"
+    ).all()
+    assert matched == [(node_id,)]
+
+def test_unknown_directions_are_not_cached(client, db_session):
+    """Test that unknown direction names do not create rendered cache entries."""
+    from app.cache import ENTRY_OVERHEAD, RenderedCache, rendered_cache
+
+    db_session.add(RoadmapNode(direction="backend", title="Python Basics", resources=[]))
+    db_session.commit()
+    rendered_cache.invalidate()
+
+    for name in ("nope-1", "nope-2"):
+        assert client.get(f"/roadmap/directions/{name}").json() == []
+        assert client.get(f"/roadmap/directions/{name}/layout").status_code == 200
+        assert client.get(f"/roadmap/directions/{name}", params={"depth": 1}).json() == []
+    assert rendered_cache.stats()["entries"] == 0
+    client.get("/roadmap/directions/backend")
+    assert rendered_cache.stats()["entries"] == 1
+
+    # Ключ и накладные расходы записи учитываются в бюджете
+    cache = RenderedCache(max_bytes=3 * ENTRY_OVERHEAD)
+    for i in range(10):
+        cache.put((f"direction:{i}", "tree", "application/json"), b"[]", cache.generation)
+    assert cache.stats()["entries"] == 2
+    assert cache.stats()["size_bytes"] <= 3 * ENTRY_OVERHEAD
@@ -0,0 +1,70 @@
+"""
+Тесты рекурсивного CTE для выборки поддерева.
+"""
+from sqlalchemy import func, select
+
+from app.loader import subtree_cte, subtree_query
+from app.models import RoadmapNode
+
+
+def _node(db_session, title):
+    node = RoadmapNode(direction="backend", title=title, resources=[])
+    db_session.add(node)
+    return node
+
+
+def _ids(db_session, root_ids, max_depth=None):
+    return {node_id for (node_id,) in db_session.execute(subtree_query(root_ids, max_depth))}
+
+
+def test_subtree_query_returns_each_descendant_once(db_session):
+    root = _node(db_session, "root")
+    left = _node(db_session, "left")
+    right = _node(db_session, "right")
+    leaf = _node(db_session, "leaf")
+    unrelated = _node(db_session, "unrelated")
+    root.children.extend([left, right])
+    left.children.append(leaf)
+    right.children.append(leaf)
+    db_session.commit()
+
+    rows = db_session.execute(subtree_query([root.id])).all()
+
+    assert sorted(node_id for (node_id,) in rows) == sorted([root.id, left.id, right.id, leaf.id])
+    assert unrelated.id not in _ids(db_session, [root.id])
+    assert _ids(db_session, [root.id], max_depth=1) == {root.id, left.id, right.id}
+
+
+def test_subtree_query_respects_max_depth_and_cycles(db_session):
+    first = _node(db_session, "first")
+    second = _node(db_session, "second")
+    third = _node(db_session, "third")
+    first.children.append(second)
+    second.children.append(third)
+    third.children.append(first)
+    db_session.commit()
+
+    assert _ids(db_session, [first.id]) == {first.id, second.id, third.id}
+    assert _ids(db_session, [first.id], max_depth=1) == {first.id, second.id}
+    assert _ids(db_session, []) == set()
+
+
+def test_subtree_cte_is_linear_on_layered_dag(db_session):
+    """Test the recursive CTE itself holds one row per node, not one per path from the root."""
+    root = _node(db_session, "root")
+    level = [root]
+    for depth in range(10):
+        nodes = [_node(db_session, f"{depth}-{i}") for i in range(3)]
+        for parent in level:
+            parent.children.extend(nodes)
+        level = nodes
+    db_session.commit()
+
+    def cte_rows(max_depth=None):
+        # Строки самого CTE, без DISTINCT внешнего запроса; путей здесь 3 ** 10
+        tree = subtree_cte([root.id], max_depth)
+        return db_session.execute(select(func.count()).select_from(tree)).scalar_one()
+
+    assert cte_rows() == 1 + 10 * 3
+    assert cte_rows(max_depth=8) == 1 + 8 * 3
+    assert len(_ids(db_session, [root.id], max_depth=8)) == 1 + 8 * 3